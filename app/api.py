@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, AsyncIterator
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+
+from core.normalize import query_key
+from core.pipeline import StageTimeout
+from core.rate_limit import UpstreamUnavailable
+from core.search import search_film
+from core.workers import WorkerPoolBusy
+from streaming import SEARCH_TIMINGS
+
+API_MAX_AGE = int(os.getenv('API_MAX_AGE', '3600'))
+API_BATCH_LIMIT = int(os.getenv('API_BATCH_LIMIT', '100'))
+API_BATCH_CONCURRENCY = int(os.getenv('API_BATCH_CONCURRENCY', '8'))
+
+router = APIRouter(prefix='/api/v1')
+
+
+class BatchRequest(BaseModel):
+    queries: list[str]
+
+
+async def find(query: str) -> tuple[int, dict[str, Any]]:
+    """Ищет фильм и возвращает (HTTP-статус, тело ответа)."""
+    try:
+        watch_url, original_title, film_info = await search_film(query)
+    except (UpstreamUnavailable, WorkerPoolBusy) as e:
+        return 503, {'query': query, 'error': str(e)}
+    except StageTimeout as e:
+        return 504, {'query': query, 'error': str(e)}
+    except Exception as e:
+        return 502, {'query': query, 'error': str(e)}
+    if not film_info or not watch_url:
+        return 404, {'query': query, 'error': 'Ничего не найдено'}
+    return 200, {'query': query, 'watch_url': watch_url, 'original_title': original_title,
+                 'film': film_info.to_omdb()}
+
+
+def _dumps(body: Any) -> bytes:
+    return json.dumps(body, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode()
+
+
+@router.get('/search')
+async def search(request: Request, query: str):
+    """Фильм в формате OMDb; ответ с ETag, повторный запрос с If-None-Match получит 304."""
+    if not query.strip():
+        raise HTTPException(422, 'Пустой запрос')
+    started = time.perf_counter()
+    status, body = await find(query)
+    SEARCH_TIMINGS.record('api_search', started)
+    if status != 200:
+        headers = {'Cache-Control': 'no-store', **({'Retry-After': '30'} if status == 503 else {})}
+        return JSONResponse(body, status_code=status, headers=headers)
+
+    content = _dumps(body)
+    etag = f'"{hashlib.sha1(content).hexdigest()}"'
+    headers = {'ETag': etag, 'Cache-Control': f'public, max-age={API_MAX_AGE}'}
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status_code=304, headers=headers)
+    return Response(content, media_type='application/json', headers=headers)
+
+
+async def _batch(queries: list[str]) -> AsyncIterator[bytes]:
+    """Одна строка NDJSON на каждый запрос в порядке готовности; одинаковые запросы ищутся один раз."""
+    slots = asyncio.Semaphore(API_BATCH_CONCURRENCY)
+
+    async def bounded(query: str) -> tuple[int, dict[str, Any]]:
+        async with slots:
+            return await find(query)
+
+    unique: dict[str, asyncio.Task] = {}
+    waiting: dict[asyncio.Task, list[int]] = {}
+    for index, query in enumerate(queries):
+        # запросы с пустым ключом между собой не склеиваются
+        key = query_key(query) or f'raw:{query}'
+        if key not in unique:
+            unique[key] = asyncio.create_task(bounded(query))
+        waiting.setdefault(unique[key], []).append(index)
+    pending = set(waiting)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                status, body = task.result()
+                for index in waiting[task]:
+                    yield _dumps({**body, 'index': index, 'query': queries[index], 'status': status}) + b'\n'
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+@router.post('/search:batch')
+async def search_batch(batch: BatchRequest):
+    """Поиск многих фильмов за один запрос, ответ -- NDJSON по мере готовности."""
+    if not 0 < len(batch.queries) <= API_BATCH_LIMIT:
+        raise HTTPException(422, f'Нужно от 1 до {API_BATCH_LIMIT} запросов')
+    return StreamingResponse(_batch(batch.queries), media_type='application/x-ndjson',
+                             headers={'Cache-Control': 'no-store'})
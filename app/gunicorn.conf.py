@@ -0,0 +1,28 @@
+"""Настройки gunicorn для сайта: несколько процессов uvicorn на одном порту.
+
+Запуск из папки app: gunicorn -c gunicorn.conf.py main:app
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = [f'{os.getenv("WEB_HOST", "0.0.0.0")}:{os.getenv("WEB_PORT", "8000")}']
+# служебный порт для /internal/stats и /metrics, наружу не публикуется
+if os.getenv('INTERNAL_PORT', '9000') != os.getenv('WEB_PORT', '8000'):
+    bind.append(f'{os.getenv("INTERNAL_HOST", "0.0.0.0")}:{os.getenv("INTERNAL_PORT", "9000")}')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'uvicorn_worker.UvicornWorker'
+timeout = int(os.getenv('WEB_TIMEOUT', '60'))
+graceful_timeout = 20
+keepalive = 5
+
+# воркеры делят лимиты внешних API поровну (core/rate_limit.py)
+os.environ['WEB_CONCURRENCY'] = str(workers)
+# /metrics любого воркера отдает сумму по всем воркерам через общий каталог (core/metrics.py)
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'cinema-metrics'))
+
+
+def on_starting(_server) -> None:
+    """Значения прошлого запуска не должны попасть в счетчики нового."""
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
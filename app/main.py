@@ -1,17 +1,94 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 
-from format_card import format_movie_card, parse_kinopoisk
-from network_requests import search_imdb
+from api import router as api_router
+from core.aliases import ALIASES
+from core.breaker import breaker_stats
+from core.cache import FILM_CACHE
+from core.catalog import CATALOG
+from core.film import FilmRecord
+from core.http_client import close_client, pool_stats, start_client
+from core.metrics import CONTENT_TYPE, METRICS
+from core.rate_limit import rate_limit_stats
+from core.render_cache import RENDER_CACHE
+from core.search import search_film
+from core.single_flight import FLIGHTS
+from core.tracing import new_trace, setup_logging
+from core.workers import CPU_POOL
+from format_card import format_movie_card
+from streaming import SEARCH_TIMINGS, stream_search
+
+setup_logging()
+logger = logging.getLogger('cinema.web')
+
+# /internal/stats и /metrics отвечают только на служебном порту, который не публикуется наружу
+INTERNAL_PORT = int(os.getenv('INTERNAL_PORT', '9000'))
+
+HTTP_SECONDS = METRICS.histogram('http_response_seconds', 'Время до начала ответа сайта, секунды',
+                                 ('route', 'status'))
+for name, stats in (("pool", pool_stats), ("cache", FILM_CACHE.stats), ("single_flight", FLIGHTS.stats),
+                    ("cpu_pool", CPU_POOL.stats), ("rate_limits", rate_limit_stats), ("catalog", CATALOG.stats),
+                    ("search_timings", SEARCH_TIMINGS.stats), ("render_cache", RENDER_CACHE.stats),
+                    ("breakers", breaker_stats), ("aliases", ALIASES.stats)):
+    METRICS.collect(name, stats)
+METRICS.collect("single_flight_keys", FLIGHTS.key_stats, export=False)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    await start_client()
+    await CATALOG.load()
+    await ALIASES.load(CATALOG)
+    compile_templates()
+    flusher = asyncio.create_task(METRICS.flush_forever())
+    yield
+    flusher.cancel()
+    await asyncio.gather(flusher, return_exceptions=True)
+    await close_client()
+    CPU_POOL.shutdown()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.include_router(api_router)
 
 templates = Jinja2Templates(directory="templates")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Id запроса (из X-Request-Id или новый) для логов и время ответа по маршрутам."""
+    trace_id = new_trace(request.headers.get("X-Request-Id", "")[:64] or None)
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_SECONDS.observe(time.perf_counter() - started, getattr(route, "path", "unmatched"), response.status_code)
+    response.headers["X-Request-Id"] = trace_id
+    return response
+
+TEMPLATE_NAMES = ("index.html", "_card.html")
+
+
+def compile_templates() -> None:
+    """Компилирует шаблоны при старте; без auto_reload Jinja2 не проверяет файлы на каждом запросе."""
+    templates.env.auto_reload = False
+    for name in TEMPLATE_NAMES:
+        templates.get_template(name)
+
+
+def render_result_page(film_info: FilmRecord, watch_url: str, card: str) -> str:
+    result = {"card": card, "poster": film_info.poster, "watch_url": watch_url}
+    return templates.get_template("index.html").render(result=result, error=None)
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     return templates.TemplateResponse("index.html", {
@@ -23,15 +100,9 @@ async def index(request: Request):
 
 @app.post("/search", response_class=HTMLResponse)
 async def search(request: Request, query: str = Form(...)):
-    print('post search')
+    started = time.perf_counter()
     try:
-        watch_url, original_title, kp_info = await parse_kinopoisk(query)
-
-        film_info = kp_info
-        if original_title:
-            imdb_info = await search_imdb(original_title)
-            if imdb_info:
-                film_info = imdb_info
+        watch_url, original_title, film_info = await search_film(query)
 
         if not film_info or not watch_url:
             return templates.TemplateResponse("index.html", {
@@ -40,20 +111,15 @@ async def search(request: Request, query: str = Form(...)):
                 "error": "Ничего не найдено"
             })
 
-        card = format_movie_card(film_info)
-        poster = film_info.get("Poster")
-
-        return templates.TemplateResponse("index.html", {
-            "request": request,
-            "result": {
-                "card": card,
-                "poster": poster,
-                "watch_url": watch_url
-            },
-            "error": None
-        })
+        card = await RENDER_CACHE.render_in_pool("web", film_info, format_movie_card)
+        page = RENDER_CACHE.render("web_page", film_info,
+                                   lambda film, url: render_result_page(film, url, card), watch_url)
+        SEARCH_TIMINGS.record('search_total', started)
+        return HTMLResponse(page)
 
     except Exception as e:
+        # без текста запроса: он из пользовательских данных; строку лога с ответом связывает X-Request-Id
+        logger.exception('search failed')
         return templates.TemplateResponse("index.html", {
             "request": request,
             "result": None,
@@ -61,6 +127,31 @@ async def search(request: Request, query: str = Form(...)):
         })
 
 
+@app.post("/search/stream", response_class=StreamingResponse)
+async def search_stream(request: Request, query: str = Form(...)):
+    return StreamingResponse(stream_search(templates, request, query), media_type="text/html",
+                             headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+
+
+def is_internal(request: Request) -> bool:
+    server = request.scope.get('server')
+    return server is not None and server[1] == INTERNAL_PORT
+
+
+@app.get("/internal/stats")
+async def internal_stats(request: Request):
+    if not is_internal(request):
+        return Response(status_code=404)
+    return METRICS.snapshot()
+
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    if not is_internal(request):
+        return Response(status_code=404)
+    return Response(METRICS.render(), media_type=CONTENT_TYPE)
+
+
 @app.get("/search", response_class=HTMLResponse)
 async def search(_: Request):
     return RedirectResponse(url='/', status_code=301)
\ No newline at end of file
@@ -0,0 +1,90 @@
+import html
+import time
+from collections import deque
+from typing import Any, AsyncIterator
+
+from fastapi.templating import Jinja2Templates
+
+from core.film import FilmRecord
+from core.render_cache import RENDER_CACHE
+from core.search import search_film_progressive
+from format_card import format_movie_card
+
+STREAM_MARKER = '<!--stream-->'
+TIMINGS_WINDOW = 1000
+
+REMOVE_LOADING = "<script>document.getElementById('loading').remove()</script>\n"
+REMOVE_PENDING = "<script>document.getElementById('pending')?.remove()</script>\n"
+REPLACE_CARD = ("<script>document.getElementById('card')"
+                ".replaceWith(document.getElementById('card-omdb').content)</script>\n")
+
+
+class PhaseTimings:
+    """Длительности этапов ответа в миллисекундах по последним TIMINGS_WINDOW запросам."""
+
+    def __init__(self, window: int = TIMINGS_WINDOW) -> None:
+        self.window = window
+        self.phases: dict[str, deque[float]] = {}
+
+    def record(self, phase: str, started: float) -> None:
+        samples = self.phases.setdefault(phase, deque(maxlen=self.window))
+        samples.append((time.perf_counter() - started) * 1000)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        stats = {}
+        for phase, samples in self.phases.items():
+            ordered = sorted(samples)
+            stats[phase] = {
+                'count': len(ordered),
+                'p50_ms': round(ordered[len(ordered) // 2], 2),
+                'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+                'max_ms': round(ordered[-1], 2),
+            }
+        return stats
+
+
+SEARCH_TIMINGS = PhaseTimings()
+
+
+def _card(templates: Jinja2Templates, card: str, film_info: FilmRecord, watch_url: str, pending: bool) -> str:
+    def render(film: FilmRecord, url: str, is_pending: bool) -> str:
+        result = {'card': card, 'poster': film.poster, 'watch_url': url, 'pending': is_pending}
+        return templates.get_template('_card.html').render(result=result)
+    return RENDER_CACHE.render('web_card', film_info, render, watch_url, pending)
+
+
+async def stream_search(templates: Jinja2Templates, request: Any, query: str) -> AsyncIterator[str]:
+    """Страница поиска по частям: оболочка сразу, затем карточка Кинопоиска, затем данные OMDb.
+
+    stream_ttfb -- до отправки оболочки, stream_first_card -- до карточки
+    Кинопоиска, stream_total -- до конца ответа.
+    """
+    started = time.perf_counter()
+    page = templates.get_template('index.html').render(
+        request=request, result=None, error=None, query=query, stream=True)
+    head, tail = page.split(STREAM_MARKER, 1)
+    yield head
+    SEARCH_TIMINGS.record('stream_ttfb', started)
+
+    card_sent = enriched = False
+    try:
+        async for stage, watch_url, _, film_info in search_film_progressive(query):
+            card = await RENDER_CACHE.render_in_pool('web', film_info, format_movie_card)
+            if stage == 'kinopoisk':
+                yield REMOVE_LOADING + _card(templates, card, film_info, watch_url, pending=True)
+                card_sent = True
+                SEARCH_TIMINGS.record('stream_first_card', started)
+            else:
+                yield ('<template id="card-omdb">' + _card(templates, card, film_info, watch_url, pending=False)
+                       + '</template>\n' + REPLACE_CARD)
+                enriched = True
+                SEARCH_TIMINGS.record('stream_enriched', started)
+        if not card_sent:
+            yield REMOVE_LOADING + '<p class="error">Ничего не найдено</p>\n'
+    except Exception as e:
+        if not card_sent:
+            yield REMOVE_LOADING + f'<p class="error">{html.escape(str(e))}</p>\n'
+    if card_sent and not enriched:
+        yield REMOVE_PENDING
+    yield tail
+    SEARCH_TIMINGS.record('stream_total', started)
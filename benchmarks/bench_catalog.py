@@ -0,0 +1,82 @@
+"""Построение и поиск в локальном каталоге фильмов на синтетических названиях.
+
+Поиск идет через FilmCatalog.lookup с порогом CATALOG_MIN_SCORE, как в
+сервисах; промахи -- названия из тех же слов, которых в каталоге нет.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_catalog.py [--films 300000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.catalog import FilmCatalog  # noqa: E402
+
+SYLLABLES_RU = ('ма', 'ри', 'ко', 'ла', 'ны', 'то', 'ве', 'ст', 'ра', 'ми', 'до', 'ше', 'ка', 'зо', 'лю', 'ге',
+                'бы', 'пу', 'жа', 'фи', 'це', 'хо', 'вь', 'ёр', 'ят', 'ус', 'эн', 'ок', 'ил', 'ар')
+SYLLABLES_EN = ('ma', 'ri', 'ko', 'la', 'ny', 'to', 've', 'st', 'ra', 'mi', 'do', 'she', 'ka', 'zo', 'lu', 'ge',
+                'by', 'pu', 'zha', 'fi', 'tse', 'kho', 'v', 'yor', 'yat', 'us', 'en', 'ok', 'il', 'ar')
+
+
+def make_vocabulary(rnd: random.Random, size: int) -> list[tuple[str, str]]:
+    """Пары слов «по-русски / латиницей» из случайных слогов."""
+    words = []
+    for _ in range(size):
+        syllables = [rnd.randrange(len(SYLLABLES_RU)) for _ in range(rnd.randint(2, 4))]
+        words.append((''.join(SYLLABLES_RU[i] for i in syllables), ''.join(SYLLABLES_EN[i] for i in syllables)))
+    return words
+
+
+def typo(text: str, rnd: random.Random) -> str:
+    i = rnd.randrange(len(text))
+    return text[:i] + text[i + 1:]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--films', type=int, default=300_000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    vocabulary = make_vocabulary(rnd, 30_000)
+    films = []
+    for kp_id in range(1, args.films + 1):
+        words = rnd.sample(vocabulary, rnd.randint(2, 4))
+        films.append((kp_id, ' '.join(ru for ru, _ in words), ' '.join(en for _, en in words)))
+
+    catalog = FilmCatalog(db_path=os.devnull)
+    started = time.perf_counter()
+    for kp_id, name_ru, name_en in films:
+        catalog.add(kp_id, name_en, '2000', [name_ru, name_en])
+    build = time.perf_counter() - started
+    print(f'indexed {args.films} films ({catalog.stats()["names"]} names) in {build:.1f} s')
+
+    sample = rnd.sample(films, args.lookups)
+    misses = [(None, ' '.join(ru for ru, _ in rnd.sample(vocabulary, rnd.randint(2, 4))))
+              for _ in range(args.lookups)]
+    print(f'min_score {catalog.min_score}')
+    for label, queries in (('exact', [(film[0], film[1]) for film in sample]),
+                           ('upper/ё', [(film[0], film[1].upper().replace('Е', 'Ё')) for film in sample]),
+                           ('typo', [(film[0], typo(film[2], rnd)) for film in sample]),
+                           ('miss', misses)):
+        correct = 0
+        timings = []
+        for kp_id, query in queries:
+            started = time.perf_counter()
+            result = catalog.lookup(query)
+            timings.append(time.perf_counter() - started)
+            correct += (result is None) if kp_id is None else (result is not None and result[0] == str(kp_id))
+        timings.sort()
+        mean = sum(timings) / len(timings) * 1000
+        p99 = timings[int(len(timings) * 0.99)] * 1000
+        print(f'{label:>8}: {mean:7.3f} ms/lookup, p99 {p99:7.3f} ms, correct {correct / len(queries):.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Память и сериализация кэша фильмов: исходные ответы API против FilmRecord.
+
+До FilmRecord кэш в памяти держал ответы Кинопоиска и OMDb целиком, а в
+SQLite -- их JSON. Фильмы синтетические: записанные ответы из
+benchmarks/fixtures с уникальными id, названиями и описаниями.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_film_record.py [--films 100000]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+sys.path.insert(0, ROOT)
+
+from core.film import FilmRecord  # noqa: E402
+
+
+def payloads(films: int, source: str) -> list[str]:
+    """JSON ответов API, как они приходят по сети: у каждого фильма свои строки."""
+    with open(os.path.join(FIXTURES, f'{source}_film.json'), encoding='utf-8') as f:
+        template = json.load(f)
+    texts = []
+    for i in range(films):
+        film = dict(template)
+        if source == 'kinopoisk':
+            film.update(kinopoiskId=i, nameRu=f'{film["nameRu"]} {i}', nameOriginal=f'{film["nameOriginal"]} {i}',
+                        description=f'{film["description"]} {i}')
+        else:
+            film.update(imdbID=f'tt{i:07d}', Title=f'{film["Title"]} {i}', Plot=f'{film["Plot"]} {i}')
+        texts.append(json.dumps(film, ensure_ascii=False))
+    return texts
+
+
+def retained(build) -> tuple[list, float]:
+    """Сколько памяти остается занято результатами build после сборки мусора, МБ."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return objects, size / 2 ** 20
+
+
+def timed(label: str, count: int, step) -> list:
+    started = time.perf_counter()
+    result = [step(item) for item in range(count)]
+    elapsed = (time.perf_counter() - started) / count * 1e6
+    print(f'{label:>36}: {elapsed:8.2f} us/film')
+    return result
+
+
+def bench(source: str, films: int) -> None:
+    texts = payloads(films, source)
+    convert = FilmRecord.from_kinopoisk if source == 'kinopoisk' else FilmRecord.from_omdb
+    print(f'{source}, {films} films')
+
+    raw, raw_mb = retained(lambda: [json.loads(text) for text in texts])
+    records, records_mb = retained(lambda: [convert(json.loads(text)) for text in texts])
+    print(f'{"memory tier, raw response dicts":>36}: {raw_mb:8.1f} MB')
+    print(f'{"memory tier, FilmRecord":>36}: {records_mb:8.1f} MB  ({records_mb / raw_mb:.0%})')
+
+    timed('FilmRecord from parsed response', films, lambda i: convert(raw[i]))
+    as_json = timed('before: json.dumps of response', films, lambda i: json.dumps(raw[i], ensure_ascii=False))
+    del raw
+    as_bytes = timed('FilmRecord.to_bytes', films, lambda i: records[i].to_bytes())
+    timed('before: json.loads of response', films, lambda i: json.loads(as_json[i]))
+    timed('FilmRecord.from_bytes', films, lambda i: FilmRecord.from_bytes(as_bytes[i]))
+    json_mb = sum(len(text.encode()) for text in as_json) / 2 ** 20
+    bytes_mb = sum(len(data) for data in as_bytes) / 2 ** 20
+    print(f'{"sqlite tier, response JSON":>36}: {json_mb:8.1f} MB')
+    print(f'{"sqlite tier, FilmRecord bytes":>36}: {bytes_mb:8.1f} MB  ({bytes_mb / json_mb:.0%})')
+    assert all(FilmRecord.from_bytes(data) == record for data, record in zip(as_bytes[:1000], records))
+    print()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--films', type=int, default=100_000)
+    args = parser.parse_args()
+    for source in ('kinopoisk', 'omdb'):
+        bench(source, args.films)
+
+
+if __name__ == '__main__':
+    main()
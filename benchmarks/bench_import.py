@@ -0,0 +1,94 @@
+"""Время холодного импорта сервисов и какие тяжелые зависимости при этом загружаются.
+
+Каждый модуль импортируется в новом процессе --runs раз, из времени
+вычитается запуск пустого интерпретатора. Бот импортируется с фиктивным
+BOT_TOKEN и базой во временном каталоге, в сеть ничего не уходит.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_import.py [--runs 10] [--importtime 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (название, каталог сервиса, модуль)
+TARGETS = (
+    ('core.search', None, 'core.search'),
+    ('web: main', 'app', 'main'),
+    ('bot: main', 'tg_bot', 'main'),
+    ('bot: warmup', 'tg_bot', 'warmup'),
+)
+HEAVY = ('bs4', 'telebot', 'fastapi', 'jinja2', 'pydantic', 'aiohttp', 'dotenv')
+
+
+def command(service: str | None, code: str, importtime: bool = False) -> tuple[list[str], dict[str, str], str]:
+    path = [ROOT] if service is None else [os.path.join(ROOT, service), ROOT]
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(path)}
+    env.setdefault('BOT_TOKEN', '1:bench')
+    env.setdefault('CACHE_DB_PATH', os.path.join(tempfile.gettempdir(), 'bench_import', 'MovieData.db'))
+    cwd = ROOT if service is None else os.path.join(ROOT, service)
+    return [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', code], env, cwd
+
+
+def wall(service: str | None, code: str, runs: int) -> float | None:
+    args, env, cwd = command(service, code)
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        if subprocess.run(args, env=env, cwd=cwd, capture_output=True).returncode != 0:
+            return None
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def loaded(service: str | None, module: str) -> list[str]:
+    code = (f'import importlib, json, sys; importlib.import_module({module!r}); '
+            f'print(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))')
+    args, env, cwd = command(service, code)
+    result = subprocess.run(args, env=env, cwd=cwd, capture_output=True, text=True)
+    return json.loads(result.stdout) if result.returncode == 0 else []
+
+
+def slowest(service: str | None, module: str, top: int) -> list[tuple[int, str]]:
+    """Самые дорогие прямые импорты модуля по выводу -X importtime (накопительно, мкс)."""
+    args, env, cwd = command(service, f'import {module}', importtime=True)
+    stderr = subprocess.run(args, env=env, cwd=cwd, capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # у прямых импортов отступ на уровень глубже, чем у самого модуля
+        if name.startswith('   ') and not name.startswith('    '):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help='показать N самых дорогих импортов каждого модуля')
+    args = parser.parse_args()
+
+    baseline = wall(None, 'pass', args.runs)
+    print(f'{"empty interpreter":>17}: {baseline * 1000:7.1f} ms')
+    for label, service, module in TARGETS:
+        elapsed = wall(service, f'import {module}', args.runs)
+        if elapsed is None:
+            print(f'{label:>17}: import failed')
+            continue
+        print(f'{label:>17}: {(elapsed - baseline) * 1000:7.1f} ms, loads {", ".join(loaded(service, module)) or "-"}')
+        for cumulative, name in slowest(service, module, args.importtime):
+            print(f'{"":>19}{cumulative / 1000:7.1f} ms  {name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Сколько поисков по сети экономит канонический ключ запроса.
+
+Журнал запросов синтетический: популярность фильмов по закону Ципфа, каждый
+запрос -- одно из написаний названия (регистр, ё/е, пробелы, год в скобках
+или с «г.», латиница). Считается, сколько разных ключей кэша resolve:
+получается при старой нормализации (нижний регистр и пробелы) и с
+query_key, а также скорость query_key и поиска выученного соответствия.
+Латинское написание остается отдельным ключом: query_key не транслитерирует.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_normalize.py [--films 20000] [--queries 200000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_catalog import make_vocabulary  # noqa: E402
+from core.aliases import QueryAliases  # noqa: E402
+from core.normalize import query_key  # noqa: E402
+
+
+def old_key(query: str) -> str:
+    """Ключ до core.normalize."""
+    return ' '.join(query.lower().split())
+
+
+VARIANTS = (
+    lambda ru, en, year, rnd: ru,
+    lambda ru, en, year, rnd: ru.capitalize(),
+    lambda ru, en, year, rnd: ru.upper(),
+    lambda ru, en, year, rnd: ru.replace('е', 'ё') if rnd.random() < 0.5 else ru.replace('ё', 'е'),
+    lambda ru, en, year, rnd: f'  {ru}  ',
+    lambda ru, en, year, rnd: f'{ru} ({year})',
+    lambda ru, en, year, rnd: f'{ru}, {year} г.',
+    lambda ru, en, year, rnd: f'{ru} {year}',
+    lambda ru, en, year, rnd: en,
+    lambda ru, en, year, rnd: en.title(),
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--films', type=int, default=20_000)
+    parser.add_argument('--queries', type=int, default=200_000)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    vocabulary = make_vocabulary(rnd, 10_000)
+    films = []
+    for _ in range(args.films):
+        words = rnd.sample(vocabulary, rnd.randint(1, 3))
+        films.append((' '.join(ru for ru, _ in words), ' '.join(en for _, en in words), rnd.randint(1950, 2024)))
+    weights = [1 / rank for rank in range(1, args.films + 1)]
+    log = [rnd.choice(VARIANTS)(*film, rnd) for film in rnd.choices(films, weights, k=args.queries)]
+
+    for label, key in (('lower + spaces', old_key), ('query_key', query_key)):
+        started = time.perf_counter()
+        keys = [key(query) for query in log]
+        elapsed = (time.perf_counter() - started) / len(log) * 1e6
+        print(f'{label:>15}: {len(set(keys)):7} resolve keys for {len(log)} queries '
+              f'({len(set(keys)) / len(log):.1%} go to the network), {elapsed:.2f} us/query')
+
+    aliases = QueryAliases(db_path=os.devnull, max_size=len(log))
+    keys = [query_key(query) for query in log]
+    for i, key in enumerate(set(keys)):
+        aliases._remember(key, str(i), None, time.time())
+    started = time.perf_counter()
+    for key in keys:
+        aliases.lookup(key)
+    elapsed = (time.perf_counter() - started) / len(keys) * 1e6
+    print(f'{"alias lookup":>15}: {elapsed:.2f} us/query, {aliases.stats()["size"]} aliases')
+
+
+if __name__ == '__main__':
+    main()
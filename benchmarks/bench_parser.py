@@ -0,0 +1,84 @@
+"""Сравнение разбора выдачи Кинопоиска: BeautifulSoup против kp_parser.
+
+Эталонный разбор на BeautifulSoup живет здесь, сервисам bs4 не нужен:
+    pip install beautifulsoup4
+
+Запуск из корня репозитория:
+    python benchmarks/bench_parser.py [--rounds 50]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.kp_parser import find_most_wanted  # noqa: E402
+
+FIXTURE = os.path.join(ROOT, 'benchmarks', 'fixtures', 'kinopoisk_search.html')
+
+
+def get_most_wanted_film_id_css(html: str) -> tuple[str, str] | None:
+    """Эталонная реализация на BeautifulSoup, с которой сверяется kp_parser."""
+    soup = BeautifulSoup(html, 'html.parser')
+    data_id = soup.select_one('.element.most_wanted [data-id]')
+    most_wanted = soup.find('div', class_='element most_wanted')
+    if not most_wanted:
+        return None
+    info = most_wanted.find('div', class_='info')
+    if not info:
+        return None
+    gray_spans = info.find_all('span', class_='gray')
+    if not gray_spans:
+        return None
+    raw_title = gray_spans[0].get_text(strip=True)
+    title = re.sub(r',?\s*\d+\s*мин\s*$', '', raw_title)
+    if data_id:
+        return data_id['data-id'], title
+    return None
+
+
+def variants(html: str) -> dict[str, str]:
+    """Варианты страницы для проверки совпадения результатов."""
+    return {
+        'fixture': html,
+        'no_most_wanted': html.replace('element most_wanted', 'element'),
+        'no_info': html.replace('<div class="info">\n        <p class="name"><a href="/film/301/',
+                                '<div class="about">\n        <p class="name"><a href="/film/301/', 1),
+        'no_gray': html.replace('<span class="gray">The Matrix, 136 мин</span>', '', 1)
+                       .replace('<span class="gray">США', '<span class="grey">США', 1)
+                       .replace('<span class="gray"><i class="opened">', '<span><i class="opened">', 1),
+        'entities': html.replace('The Matrix, 136 мин', 'Tom &amp; Jerry <b>Movie</b>, 90 мин', 1),
+        'empty': '<html><body><p>Ничего не найдено</p></body></html>',
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    with open(FIXTURE, encoding='utf-8') as f:
+        html = f.read()
+
+    for name, page in variants(html).items():
+        expected = get_most_wanted_film_id_css(page)
+        actual = find_most_wanted(page)
+        assert expected == actual, f'{name}: {expected!r} != {actual!r}'
+        print(f'{name:>15}: {actual!r}')
+
+    print(f'\nfixture: {len(html) / 1024:.0f} KB, rounds: {args.rounds}')
+    results = {}
+    for name, func in (('beautifulsoup', get_most_wanted_film_id_css), ('kp_parser', find_most_wanted)):
+        seconds = min(timeit.repeat(lambda: func(html), number=args.rounds, repeat=3)) / args.rounds
+        results[name] = seconds
+        print(f'{name:>15}: {seconds * 1000:8.3f} ms/page')
+    print(f'{"speedup":>15}: {results["beautifulsoup"] / results["kp_parser"]:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Стоимость сборки карточки фильма на запрос: без кэша и с кэшем готовых карточек.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_render.py [--service app|tg_bot] [--requests 20000]
+    CPU_EXECUTOR=process python benchmarks/bench_render.py
+"""
+import argparse
+import asyncio
+import copy
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.film import FilmRecord  # noqa: E402
+
+FILM = FilmRecord.from_omdb({
+    'Title': 'The Matrix', 'Year': '1999', 'Rated': 'R', 'Runtime': '136 min', 'Genre': 'Action, Sci-Fi',
+    'Director': 'Lana Wachowski, Lilly Wachowski', 'Actors': 'Keanu Reeves, Laurence Fishburne, Carrie-Anne Moss',
+    'Plot': 'When a beautiful stranger leads computer hacker Neo to a forbidding underworld, he discovers '
+            'the shocking truth--the life he knows is the elaborate deception of an evil cyber-intelligence.',
+    'Poster': 'https://m.media-amazon.com/images/M/matrix.jpg', 'imdbRating': '8.7', 'Metascore': '73',
+    'Ratings': [{'Source': 'Internet Movie Database', 'Value': '8.7/10'},
+                {'Source': 'Rotten Tomatoes', 'Value': '83%'}, {'Source': 'Metacritic', 'Value': '73/100'}],
+    'BoxOffice': '$172,076,928', 'imdbID': 'tt0133093', 'Response': 'True',
+})
+WATCH_URL = 'https://flcksbr.top/film/301'
+
+
+def measure(label: str, requests: int, step) -> None:
+    started = time.perf_counter()
+    for _ in range(requests):
+        step()
+    elapsed = (time.perf_counter() - started) / requests * 1e6
+    print(f'{label:>42}: {elapsed:8.2f} us/request')
+
+
+def measure_pool(requests: int, flavor: str) -> None:
+    """Карточка через CPU_POOL (режим из CPU_EXECUTOR) против попадания в кэш до пула."""
+    from core.render_cache import RENDER_CACHE  # noqa: E402
+    from core.workers import CPU_POOL  # noqa: E402
+    from format_card import format_movie_card  # noqa: E402
+
+    async def run(label: str, step) -> None:
+        started = time.perf_counter()
+        for _ in range(requests):
+            await step()
+        elapsed = (time.perf_counter() - started) / requests * 1e6
+        print(f'{label:>42}: {elapsed:8.2f} us/request')
+
+    async def both() -> None:
+        await run(f'before: card via {CPU_POOL.mode} pool', lambda: CPU_POOL.run(format_movie_card, FILM))
+        await run(f'render cache hit before {CPU_POOL.mode} pool',
+                  lambda: RENDER_CACHE.render_in_pool(flavor, FILM, format_movie_card))
+        CPU_POOL.shutdown()
+
+    asyncio.run(both())
+
+
+def bench_app(requests: int) -> None:
+    os.chdir(os.path.join(ROOT, 'app'))
+    import main  # noqa: E402
+    from core.render_cache import RENDER_CACHE  # noqa: E402
+    from format_card import format_movie_card  # noqa: E402
+
+    def before() -> None:
+        card = format_movie_card(FILM)
+        main.templates.get_template('index.html').render(
+            request=None, error=None, result={'card': card, 'poster': FILM.poster, 'watch_url': WATCH_URL})
+
+    main.templates.env.auto_reload = True
+    measure('before: f-string card + index.html', requests, before)
+
+    main.compile_templates()
+    measure('compiled once, no cache', requests,
+            lambda: main.render_result_page(FILM, WATCH_URL, format_movie_card(FILM)))
+
+    def after(film: FilmRecord) -> None:
+        card = RENDER_CACHE.render('web', film, format_movie_card)
+        RENDER_CACHE.render('web_page', film, lambda f, url: main.render_result_page(f, url, card), WATCH_URL)
+
+    measure('render cache hit, same record', requests, lambda: after(FILM))
+    equal_film = copy.deepcopy(FILM)
+    measure('render cache hit, equal record copy', requests, lambda: after(equal_film))
+    measure_pool(requests, 'web')
+    print(RENDER_CACHE.stats())
+
+
+def bench_tg_bot(requests: int) -> None:
+    from core.render_cache import RENDER_CACHE  # noqa: E402
+    from format_card import format_movie_card  # noqa: E402
+
+    measure('before: f-string card', requests, lambda: format_movie_card(FILM))
+    measure('render cache hit, same record', requests, lambda: RENDER_CACHE.render('telegram', FILM, format_movie_card))
+    measure_pool(requests, 'telegram')
+    print(RENDER_CACHE.stats())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--service', choices=('app', 'tg_bot'), default='app')
+    parser.add_argument('--requests', type=int, default=20_000)
+    args = parser.parse_args()
+    sys.path[:0] = [os.path.join(ROOT, args.service), ROOT]
+    if args.service == 'app':
+        bench_app(args.requests)
+    else:
+        bench_tg_bot(args.requests)
+
+
+if __name__ == '__main__':
+    main()
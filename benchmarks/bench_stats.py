@@ -0,0 +1,89 @@
+"""Запросы /stats и /history на синтетической таблице stats до и после миграции.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_stats.py [--rows 2000000] [--users 20000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'tg_bot'), ROOT]
+
+from load_data import MovieData  # noqa: E402
+
+OLD_STATS = ('SELECT original_title, count(*) FROM stats WHERE user_name = ? '
+             'GROUP BY original_title ORDER BY count(*) DESC LIMIT 30')
+HISTORY = 'SELECT query, original_title FROM stats WHERE user_name = ? ORDER BY id DESC LIMIT 30'
+
+
+def fill(db_path: str, rows: int, users: int, titles: int) -> None:
+    """Заполняет таблицу в старой схеме: без индекса и таблицы счетчиков."""
+    rnd = random.Random(42)
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE stats (id INTEGER PRIMARY KEY AUTOINCREMENT, user_name TEXT, '
+                 'query TEXT, original_title TEXT)')
+    batch = 100_000
+    for start in range(0, rows, batch):
+        conn.executemany(
+            'INSERT INTO stats (user_name, query, original_title) VALUES (?, ?, ?)',
+            ((f'user{int(rnd.paretovariate(1.2)) % users}', f'query {i}', f'Film {int(rnd.paretovariate(1.1)) % titles}')
+             for i in range(start, min(rows, start + batch))))
+        conn.commit()
+    conn.close()
+
+
+def measure(conn: sqlite3.Connection, sql: str, user_names: list[str]) -> float:
+    started = time.perf_counter()
+    for user_name in user_names:
+        conn.execute(sql, (user_name,)).fetchall()
+    return (time.perf_counter() - started) / len(user_names) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--users', type=int, default=20_000)
+    parser.add_argument('--titles', type=int, default=50_000)
+    parser.add_argument('--lookups', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'MovieData.db')
+        started = time.perf_counter()
+        fill(db_path, args.rows, args.users, args.titles)
+        print(f'filled {args.rows} rows in {time.perf_counter() - started:.1f} s')
+
+        # самые активные пользователи -- худший случай для GROUP BY,
+        # редкие -- для поиска последних 30 запросов без индекса
+        conn = sqlite3.connect(db_path)
+        counts = conn.execute('SELECT user_name FROM stats GROUP BY user_name ORDER BY count(*) DESC').fetchall()
+        half = args.lookups // 2
+        user_names = [row[0] for row in counts[:half] + counts[-half:]]
+        old_stats = measure(conn, OLD_STATS, user_names)
+        old_history = measure(conn, HISTORY, user_names)
+        conn.close()
+
+        started = time.perf_counter()
+        data = MovieData(db_path)
+        print(f'migration took {time.perf_counter() - started:.1f} s')
+        new_stats = measure(data.get_connection(), 'SELECT original_title, count FROM user_title_stats '
+                            'WHERE user_name = ? ORDER BY count DESC LIMIT 30', user_names)
+        new_history = measure(data.get_connection(), HISTORY, user_names)
+        for user_name in user_names[:5]:
+            expected = sorted(count for _, count in data.get_connection().execute(OLD_STATS, (user_name,)))
+            actual = sorted(row['count(*)'] for row in data.select_stats_by_user(user_name))
+            assert expected == actual, user_name
+        data.close()
+
+    print(f'{"query":>10} {"before, ms":>12} {"after, ms":>12}')
+    print(f'{"/stats":>10} {old_stats:12.3f} {new_stats:12.3f}')
+    print(f'{"/history":>10} {old_history:12.3f} {new_history:12.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Масштабирование сайта по числу воркеров gunicorn.
+
+Запускает loadtest.py --target web с 1, 2, ... --max-workers воркерами на
+одних и тех же запросах и сводит RPS, p95, процессорное время на запрос и
+число запросов к внешним API. Без аренды ключей в общем кэше (CACHE_LEASES=0)
+каждый воркер загружал бы одни и те же фильмы сам, и запросов к API было бы
+больше с каждым воркером. Рост RPS ограничен числом ядер машины.
+
+Запуск из корня репозитория (остальные параметры передаются в loadtest.py):
+    python benchmarks/bench_workers.py --max-workers 4 -- --requests 2000 --concurrency 32
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOADTEST = os.path.join(ROOT, 'benchmarks', 'loadtest.py')
+
+
+def run(workers: int, extra: list[str], workdir: str) -> dict:
+    output = os.path.join(workdir, f'workers-{workers}.json')
+    subprocess.run([sys.executable, LOADTEST, '--target', 'web', '--workers', str(workers), '--output', output,
+                    *extra], check=True, stdout=subprocess.DEVNULL)
+    with open(output) as f:
+        return json.load(f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('loadtest', nargs=argparse.REMAINDER, help='параметры loadtest.py после --')
+    args = parser.parse_args()
+    extra = [arg for arg in args.loadtest if arg != '--']
+    print(f'cpu cores: {os.cpu_count()}')
+    print(f'{"workers":>7} {"rps":>9} {"speedup":>8} {"p95 ms":>9} {"cpu ms/req":>10} {"upstream":>9}  outcomes')
+    base = None
+    with tempfile.TemporaryDirectory(prefix='bench-workers-') as workdir:
+        for workers in range(1, args.max_workers + 1):
+            result = run(workers, extra, workdir)
+            base = base or result['rps']
+            upstream = sum(result['upstream_requests'].values())
+            print(f'{workers:>7} {result["rps"]:>9.1f} {result["rps"] / base:>7.2f}x '
+                  f'{result["latency_ms"]["p95"]:>9.1f} {result["cpu_ms_per_request"] or 0:>10.2f} {upstream:>9}  '
+                  f'{result["outcomes"]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Заглушка Telegram Bot API и нагрузка на бота через нее.
+
+Бот направляется на заглушку переменной TELEGRAM_API_URL. Заглушка
+записывает ответы бота; с --drive она сама шлет боту сообщения от --chats
+чатов по --messages от каждого и проверяет, что ответы в каждом чате пришли
+в порядке сообщений. Внешние API при этом удобно подменить на
+benchmarks/stub_upstream.py.
+
+    python benchmarks/fake_telegram.py --port 8082 --drive webhook --webhook http://127.0.0.1:8080/telegram \
+        --secret $WEBHOOK_SECRET
+    python benchmarks/fake_telegram.py --port 8082 --drive polling
+"""
+import argparse
+import asyncio
+import itertools
+import re
+import time
+from collections import defaultdict
+from urllib.parse import parse_qsl
+
+import aiohttp
+from aiohttp import web
+
+from stub_upstream import film_id
+
+FILM_RE = re.compile(r'Film (\d+)')
+
+
+class FakeTelegram:
+    def __init__(self) -> None:
+        self.message_ids = itertools.count(1)
+        self.update_ids = itertools.count(1)
+        self.updates: asyncio.Queue[dict] = asyncio.Queue()
+        self.replies: dict[int, list[str]] = defaultdict(list)
+        self.calls: dict[str, int] = defaultdict(int)
+        self.replied = asyncio.Condition()
+
+    def message(self, chat_id: int, text: str | None = None, **extra) -> dict:
+        return {'message_id': next(self.message_ids), 'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private', 'username': f'user{chat_id}'},
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': 'user', 'username': f'user{chat_id}'},
+                **({'text': text} if text is not None else {}), **extra}
+
+    def update(self, chat_id: int, text: str) -> dict:
+        return {'update_id': next(self.update_ids), 'message': self.message(chat_id, text)}
+
+    @staticmethod
+    async def params(request: web.Request) -> dict[str, str]:
+        """Параметры вызова: telebot шлет форму в теле даже GET-запросов."""
+        params = dict(request.query)
+        if request.content_type == 'multipart/form-data':
+            reader = await request.multipart()
+            while (part := await reader.next()) is not None:
+                params[part.name] = await part.text()
+        elif request.body_exists:
+            params.update(parse_qsl(await request.text()))
+        return params
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.calls[method] += 1
+        params = await self.params(request)
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'bot', 'username': 'bot'}
+        elif method == 'getUpdates':
+            result = await self.get_updates(int(params.get('limit') or 100), float(params.get('timeout') or 0))
+        elif method in ('sendMessage', 'sendPhoto'):
+            chat_id = int(params['chat_id'])
+            if method == 'sendPhoto':
+                result = self.message(chat_id, photo=[{'file_id': f'file-{params["photo"][-16:]}',
+                                                       'file_unique_id': 'u', 'width': 1, 'height': 1}])
+                text = params.get('caption')
+            else:
+                result = self.message(chat_id, params['text'])
+                text = params['text']
+            if text:
+                async with self.replied:
+                    self.replies[chat_id].append(text)
+                    self.replied.notify_all()
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def get_updates(self, limit: int, timeout: float) -> list[dict]:
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self.updates.get(), timeout))
+        except asyncio.TimeoutError:
+            return updates
+        while len(updates) < limit and not self.updates.empty():
+            updates.append(self.updates.get_nowait())
+        return updates
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        app.router.add_get('/bot{token}/{method}', self.handle)
+        return app
+
+
+async def drive(fake: FakeTelegram, mode: str, webhook: str, secret: str, chats: int, messages: int,
+                timeout: float) -> None:
+    sent = {chat_id: [f'chat {chat_id} film {i}' for i in range(messages)] for chat_id in range(1, chats + 1)}
+    expected = {chat_id: [film_id(text) for text in texts] for chat_id, texts in sent.items()}
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(headers={'X-Telegram-Bot-Api-Secret-Token': secret}) as session:
+        for i in range(messages):
+            for chat_id, texts in sent.items():
+                update = fake.update(chat_id, texts[i])
+                if mode == 'polling':
+                    fake.updates.put_nowait(update)
+                else:
+                    async with session.post(webhook, json=update) as response:
+                        response.raise_for_status()
+    accepted = time.perf_counter() - started
+
+    def cards() -> dict[int, list[int]]:
+        return {chat_id: [int(m[1]) for reply in fake.replies[chat_id] if (m := FILM_RE.search(reply))]
+                for chat_id in sent}
+
+    async with fake.replied:
+        try:
+            await asyncio.wait_for(fake.replied.wait_for(
+                lambda: all(len(ids) >= messages for ids in cards().values())), timeout)
+        except asyncio.TimeoutError:
+            pass
+    elapsed = time.perf_counter() - started
+    received = cards()
+    answered = sum(len(ids) for ids in received.values())
+    # отброшенные при перегрузке сообщения пропускаются, но порядок остальных должен сохраниться
+    positions = {chat_id: [expected[chat_id].index(i) for i in ids] for chat_id, ids in received.items()}
+    out_of_order = sum(order != sorted(order) for order in positions.values())
+    print(f'{mode}: {chats} chats x {messages} messages, all sent in {accepted:.2f} s')
+    print(f'cards {answered}/{chats * messages} in {elapsed:.2f} s, {answered / elapsed:.1f} msg/s, '
+          f'chats out of order: {out_of_order}, other replies: '
+          f'{sum(len(replies) for replies in fake.replies.values()) - answered}')
+    print(f'bot api calls: {dict(fake.calls)}')
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--drive', choices=('webhook', 'polling'))
+    parser.add_argument('--webhook', default='http://127.0.0.1:8080/telegram')
+    parser.add_argument('--secret', default='', help='WEBHOOK_SECRET бота для --drive webhook')
+    parser.add_argument('--chats', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    fake = FakeTelegram()
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    try:
+        if args.drive:
+            await drive(fake, args.drive, args.webhook, args.secret, args.chats, args.messages, args.timeout)
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,360 @@
+"""Нагрузочный тест поиска без сети: POST /search сайта или текстовое сообщение боту.
+
+Поднимает в этом процессе заглушку внешних API (stub_upstream, по
+умолчанию с записанными ответами) и для бота -- заглушку Bot API
+(fake_telegram), а сервис запускает отдельным процессом с чистой базой.
+--concurrency клиентов шлют запросы один за другим; у бота каждый клиент --
+отдельный чат, сообщение отправляется вебхуком, ответом считается карточка
+в этом чате. Запросы берутся по кругу из --distinct названий, поэтому
+повторы попадают в кэш так же, как в жизни.
+
+Сайт с --workers N запускается через gunicorn с N воркерами
+(app/gunicorn.conf.py), без него -- одним процессом uvicorn.
+
+Результат -- RPS, p50/p95/p99 задержки, процессорное время сервиса (со
+всеми дочерними процессами) на запрос и число запросов к внешним API --
+печатается и сохраняется в JSON (по умолчанию
+benchmarks/results/<target>-<commit>.json); --compare сравнивает с
+сохраненным ранее прогоном.
+
+Запуск из корня репозитория:
+    python benchmarks/loadtest.py --target web --requests 2000 --concurrency 32
+    python benchmarks/loadtest.py --target bot --latency omdb=0.3 --errors kinopoisk=0.05
+    python benchmarks/loadtest.py --target web --workers 4
+    python benchmarks/loadtest.py --target web --compare benchmarks/results/web-1a2b3c4d.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Awaitable, Callable
+
+import aiohttp
+from aiohttp import web
+
+from fake_telegram import FakeTelegram
+from stub_upstream import make_app, per_upstream, upstream_of
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARD_RE = re.compile(r'(Film|Фильм) \d+')
+WEBHOOK_SECRET = 'loadtest'
+# лимиты внешних API не должны ограничивать нагрузку на заглушку
+UNLIMITED = {f'{name}_{setting}': value for name in ('KINOPOISK', 'KINOPOISK_API', 'OMDB')
+             for setting, value in (('RPS', '100000'), ('BURST', '100000'), ('DAILY_QUOTA', '0'))}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def git_commit() -> str:
+    result = subprocess.run(['git', 'rev-parse', '--short=8', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or 'unknown'
+
+
+def cpu_seconds(pid: int) -> float | None:
+    """Процессорное время процесса (user + system) из /proc; вне Linux -- None."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def descendants(pid: int) -> list[int]:
+    """pid и все его потомки, например воркеры gunicorn."""
+    children: dict[int, list[int]] = {}
+    for name in os.listdir('/proc') if os.path.isdir('/proc') else ():
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(name))
+    found, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        found.append(current)
+        stack.extend(children.get(current, ()))
+    return found
+
+
+class Service:
+    """Сервис в отдельном процессе; логи пишутся в каталог прогона."""
+
+    def __init__(self, name: str, args: list[str], cwd: str, env: dict[str, str], workdir: str) -> None:
+        self.log_path = os.path.join(workdir, f'{name}.log')
+        self.log = open(self.log_path, 'w')
+        self.process = subprocess.Popen(args, cwd=cwd, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+        self.stats_url: str | None = None
+
+    async def wait_ready(self, url: str, timeout: float = 30) -> None:
+        """Ждет, пока url (/internal/stats сервиса) не ответит 200."""
+        self.stats_url = url
+        deadline = time.monotonic() + timeout
+        async with aiohttp.ClientSession() as session:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    break
+                try:
+                    async with session.get(url) as response:
+                        if response.status == 200:
+                            return
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.1)
+        raise RuntimeError(f'service did not start, see {self.log_path}')
+
+    def cpu(self) -> float | None:
+        seconds = [cpu_seconds(pid) for pid in descendants(self.process.pid)]
+        return sum(value for value in seconds if value is not None) if seconds[0] is not None else None
+
+    async def stats(self) -> dict:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(self.stats_url) as response:
+                return await response.json()
+
+    def stop(self) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+
+
+def service_env(stub_url: str, workdir: str, extra: dict[str, str]) -> dict[str, str]:
+    return {**os.environ, **UNLIMITED, 'PYTHONPATH': ROOT,
+            'KINOPOISK_URL': stub_url, 'KINOPOISK_API_URL': stub_url, 'OMDB_URL': stub_url,
+            'CACHE_DB_PATH': os.path.join(workdir, 'data', 'MovieData.db'), 'LOG_LEVEL': 'WARNING', **extra}
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+async def drive(send: Callable[[int, str], Awaitable[str]], queries: list[str], concurrency: int,
+                warmup: int, on_start: Callable[[], None]) -> tuple[list[float], Counter[str], float, int]:
+    """Замкнутый цикл: каждый клиент шлет следующий запрос, получив ответ на предыдущий.
+
+    Первые warmup запросов не учитываются, перед первым учтенным вызывается
+    on_start. Возвращает задержки, исходы, время замера и число учтенных запросов.
+    """
+    latencies: list[float] = []
+    outcomes: Counter[str] = Counter()
+    next_index = 0
+    measured_from = asyncio.Event()
+    started = 0.0
+
+    async def client(worker: int) -> None:
+        nonlocal next_index, started
+        while next_index < len(queries):
+            index = next_index
+            next_index += 1
+            if index == warmup:
+                on_start()
+                started = time.perf_counter()
+                measured_from.set()
+            request_started = time.perf_counter()
+            try:
+                outcome = await send(worker, queries[index])
+            except Exception as e:
+                outcome = type(e).__name__
+            if index >= warmup:
+                latencies.append(time.perf_counter() - request_started)
+                outcomes[outcome] += 1
+
+    await asyncio.gather(*(client(worker) for worker in range(concurrency)))
+    elapsed = time.perf_counter() - started if measured_from.is_set() else 0.0
+    return latencies, outcomes, elapsed, max(0, len(queries) - warmup)
+
+
+async def run_web(args: argparse.Namespace, stub_url: str, workdir: str, queries: list[str], on_measure) -> dict:
+    port = free_port()
+    if args.workers:
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'main:app', '--log-level', 'warning']
+        extra = {'WEB_HOST': '127.0.0.1', 'WEB_PORT': str(port), 'WEB_CONCURRENCY': str(args.workers)}
+    else:
+        command = [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning']
+        extra = {}
+    # служебные адреса на том же порту, что и поиск
+    extra['INTERNAL_PORT'] = str(port)
+    service = Service('web', command, os.path.join(ROOT, 'app'), service_env(stub_url, workdir, extra), workdir)
+    try:
+        await service.wait_ready(f'http://127.0.0.1:{port}/internal/stats')
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        timeout = aiohttp.ClientTimeout(total=args.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            async def send(_: int, query: str) -> str:
+                async with session.post(f'http://127.0.0.1:{port}/search', data={'query': query}) as response:
+                    body = await response.text()
+                if response.status != 200:
+                    return f'http_{response.status}'
+                return 'ok' if 'id="card"' in body else 'no_card'
+
+            return await on_measure(send, service)
+    finally:
+        service.stop()
+
+
+async def run_bot(args: argparse.Namespace, stub_url: str, workdir: str, queries: list[str], on_measure) -> dict:
+    fake = FakeTelegram()
+    telegram_port, webhook_port, internal_port = free_port(), free_port(), free_port()
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', telegram_port).start()
+    env = service_env(stub_url, workdir, {
+        'BOT_TOKEN': '1:loadtest', 'BOT_MODE': 'webhook', 'TELEGRAM_API_URL': f'http://127.0.0.1:{telegram_port}',
+        'WEBHOOK_HOST': '127.0.0.1', 'WEBHOOK_PORT': str(webhook_port), 'WEBHOOK_URL': '',
+        'WEBHOOK_SECRET': WEBHOOK_SECRET,
+        'INTERNAL_HOST': '127.0.0.1', 'INTERNAL_PORT': str(internal_port),
+        'BOT_QUEUE_SIZE': str(max(256, args.concurrency * 2))})
+    service = Service('bot', [sys.executable, 'main.py'], os.path.join(ROOT, 'tg_bot'), env, workdir)
+    try:
+        await service.wait_ready(f'http://127.0.0.1:{internal_port}/internal/stats')
+        timeout = aiohttp.ClientTimeout(total=args.timeout)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async def send(worker: int, query: str) -> str:
+                chat_id = worker + 1
+                async with fake.replied:
+                    seen = len(fake.replies[chat_id])
+                async with session.post(f'http://127.0.0.1:{webhook_port}/telegram', json=fake.update(chat_id, query),
+                                        headers={'X-Telegram-Bot-Api-Secret-Token': WEBHOOK_SECRET}) as response:
+                    if response.status != 200:
+                        return f'http_{response.status}'
+                async with fake.replied:
+                    await asyncio.wait_for(fake.replied.wait_for(lambda: len(fake.replies[chat_id]) > seen),
+                                           args.timeout)
+                    reply = fake.replies[chat_id][seen]
+                return 'ok' if CARD_RE.search(reply) else 'error_reply'
+
+            return await on_measure(send, service)
+    finally:
+        service.stop()
+        await runner.cleanup()
+
+
+def compare(result: dict, baseline: dict) -> None:
+    print(f'\ncompared with {baseline["commit"]} ({baseline["date"]}):')
+    rows = [('rps', result['rps'], baseline['rps'])]
+    rows += [(f'{name} ms', result['latency_ms'][name], baseline['latency_ms'][name])
+             for name in ('p50', 'p95', 'p99')]
+    if result['cpu_ms_per_request'] is not None and baseline['cpu_ms_per_request'] is not None:
+        rows.append(('cpu ms/request', result['cpu_ms_per_request'], baseline['cpu_ms_per_request']))
+    if result.get('cache', {}).get('hit_rate') is not None and baseline.get('cache', {}).get('hit_rate') is not None:
+        rows.append(('cache hit rate', result['cache']['hit_rate'], baseline['cache']['hit_rate']))
+    for name, now, before in rows:
+        change = f'{(now - before) / before * 100:+.1f}%' if before else 'n/a'
+        print(f'{name:>15}: {before:10.2f} -> {now:10.2f}  {change}')
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--target', choices=('web', 'bot'), default='web')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=0, help='сайт через gunicorn с этим числом воркеров')
+    parser.add_argument('--distinct', type=int, default=200, help='сколько разных названий в запросах')
+    parser.add_argument('--warmup', type=int, default=50, help='сколько первых запросов не учитывать')
+    parser.add_argument('--timeout', type=float, default=30, help='таймаут одного запроса, секунды')
+    parser.add_argument('--latency', action='append', default=[], help='задержка заглушки: 0.05 или omdb=0.3')
+    parser.add_argument('--jitter', action='append', default=[], help='средняя случайная добавка к задержке')
+    parser.add_argument('--errors', action='append', default=[], help='доля ошибок заглушки: 0.1 или omdb=0.1')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--synthetic', action='store_true', help='короткие синтетические ответы вместо записанных')
+    parser.add_argument('--output', help='куда сохранить JSON (benchmarks/results/<target>-<commit>.json)')
+    parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+    args = parser.parse_args()
+
+    settings = {
+        'requests': args.requests, 'concurrency': args.concurrency, 'distinct': args.distinct,
+        'warmup': args.warmup, 'latency': per_upstream(args.latency, 0.05), 'jitter': per_upstream(args.jitter),
+        'errors': per_upstream(args.errors), 'error_status': args.error_status, 'seed': args.seed,
+        'replay': not args.synthetic, 'workers': args.workers,
+    }
+    stub = web.AppRunner(make_app(settings['latency'], settings['jitter'], settings['errors'], args.error_status,
+                                  args.seed, settings['replay']))
+    await stub.setup()
+    stub_port = free_port()
+    await web.TCPSite(stub, '127.0.0.1', stub_port).start()
+    stub_url = f'http://127.0.0.1:{stub_port}'
+    queries = [f'loadtest film {args.seed}-{i % args.distinct}' for i in range(args.warmup + args.requests)]
+
+    async def on_measure(send: Callable[[int, str], Awaitable[str]], service: Service) -> dict:
+        cpu_before = None
+
+        def on_start() -> None:
+            nonlocal cpu_before
+            cpu_before = service.cpu()
+
+        latencies, outcomes, elapsed, measured = await drive(send, queries, args.concurrency, args.warmup, on_start)
+        cpu_after = service.cpu()
+        cache = (await service.stats()).get('cache', {})
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f'{stub_url}/stub/stats') as response:
+                hits = (await response.json())['hits']
+        upstream = Counter()
+        for path, count in hits.items():
+            if upstream_of(path) is not None:
+                upstream[upstream_of(path)] += count
+        ordered = sorted(latencies)
+        cpu = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+        return {
+            'rps': round(measured / elapsed, 2) if elapsed else 0.0,
+            'latency_ms': {name: round(percentile(ordered, p) * 1000, 2)
+                           for name, p in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))},
+            'outcomes': dict(outcomes),
+            'elapsed_s': round(elapsed, 3),
+            'cpu_ms_per_request': round(cpu / measured * 1000, 3) if cpu is not None and measured else None,
+            # у нескольких воркеров -- статистика одного из них
+            'cache': {name: cache.get(name) for name in ('lookups', 'hit_rate', 'prefetched', 'prefetch_hits',
+                                                          'prefetch_uplift', 'lease_hits')},
+            # за весь прогон вместе с разогревом
+            'upstream_requests': dict(upstream),
+        }
+
+    try:
+        with tempfile.TemporaryDirectory(prefix='loadtest-') as workdir:
+            run = run_web if args.target == 'web' else run_bot
+            metrics = await run(args, stub_url, workdir, queries, on_measure)
+    finally:
+        await stub.cleanup()
+
+    commit = git_commit()
+    result = {'target': args.target, 'commit': commit, 'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(), 'settings': settings, **metrics}
+    latency = result['latency_ms']
+    print(f'{args.target}: {args.requests} requests, concurrency {args.concurrency}, {result["rps"]} rps')
+    print(f'latency ms: p50 {latency["p50"]}, p95 {latency["p95"]}, p99 {latency["p99"]}, max {latency["max"]}')
+    print(f'cpu per request: {result["cpu_ms_per_request"]} ms, outcomes: {result["outcomes"]}')
+    print(f'film cache: {result["cache"]}')
+    print(f'upstream requests: {result["upstream_requests"]}')
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', f'{args.target}-{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f'saved to {output}')
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
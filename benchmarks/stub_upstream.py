@@ -0,0 +1,210 @@
+"""Локальная заглушка внешних API: kinopoisk.ru, kinopoiskapiunofficial.tech и OMDb.
+
+Отвечает детерминированными данными: id фильма вычисляется из запроса, так
+что разные названия дают разные фильмы. Сервисы направляются на заглушку
+через переменные окружения:
+
+    python benchmarks/stub_upstream.py --port 8081 &
+    export KINOPOISK_URL=http://127.0.0.1:8081 KINOPOISK_API_URL=http://127.0.0.1:8081 \
+           OMDB_URL=http://127.0.0.1:8081
+
+С --replay ответы строятся из записанных страницы поиска и JSON в
+benchmarks/fixtures, с подставленными id и названием. Задержка и ошибки
+задаются для всех API сразу (--latency 0.05) или для одного
+(--latency omdb=0.3); имена API: kinopoisk, kinopoisk_api, omdb. Случайная
+часть задержки и ошибки определяются --seed и самим запросом, поэтому
+повторный прогон воспроизводит их.
+
+    python benchmarks/stub_upstream.py --replay --latency 0.05 --jitter omdb=0.2 --errors kinopoisk=0.05
+
+GET /stub/stats -- сколько запросов пришло на каждый адрес и сколько ошибок отдано.
+"""
+import argparse
+import asyncio
+import copy
+import html
+import json
+import os
+import random
+import zlib
+from collections import Counter
+
+from aiohttp import web
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+UPSTREAMS = ('kinopoisk', 'kinopoisk_api', 'omdb')
+
+SEARCH_PAGE = """<html><body><div class="search_results">
+<div class="element most_wanted"><p class="pic"><a href="/film/{id}/" data-id="{id}" data-type="film"></a></p>
+<div class="info"><p class="name"><a href="/film/{id}/">{name_ru}</a></p>
+<span class="gray">{name}, 120 мин</span></div></div>
+</div></body></html>"""
+
+
+def film_id(query: str) -> int:
+    return zlib.crc32(' '.join(query.lower().split()).encode()) % 1_000_000 + 1
+
+
+def kinopoisk_film(kp_id: int) -> dict:
+    return {
+        'kinopoiskId': kp_id, 'imdbId': f'tt{kp_id:07d}', 'nameRu': f'Фильм {kp_id}',
+        'nameOriginal': f'Film {kp_id}', 'year': 1990 + kp_id % 35, 'filmLength': 120,
+        'ratingKinopoisk': 7.5, 'ratingImdb': 7.1, 'ratingAgeLimits': 'age16',
+        'genres': [{'genre': 'драма'}], 'countries': [{'country': 'США'}],
+        'description': 'Описание фильма из заглушки.', 'posterUrl': f'https://example.com/{kp_id}.jpg',
+    }
+
+
+def omdb_film(imdb_id: str) -> dict:
+    return {
+        'Response': 'True', 'imdbID': imdb_id, 'Title': f'Film {int(imdb_id[2:])}', 'Year': '2000',
+        'imdbRating': '7.1', 'Metascore': '70', 'Genre': 'Drama', 'Runtime': '120 min',
+        'Director': 'Stub Director', 'Actors': 'Stub Actor', 'Plot': 'Stub plot.',
+        'Ratings': [{'Source': 'Rotten Tomatoes', 'Value': '80%'}], 'Poster': 'N/A',
+    }
+
+
+class Replay:
+    """Записанные ответы внешних API, в которые подставляется нужный фильм."""
+
+    def __init__(self, fixtures: str = FIXTURES) -> None:
+        with open(os.path.join(fixtures, 'kinopoisk_search.html'), encoding='utf-8') as f:
+            page = f.read()
+        start = page.index('<div class="element most_wanted">')
+        end = page.index('<div class="element', start + 1)
+        block = (page[start:end].replace('/film/301/', '/film/{id}/').replace('data-id="301"', 'data-id="{id}"')
+                 .replace('Матрица', '{name_ru}').replace('The Matrix', '{name}'))
+        self.page_head, self.block, self.page_tail = page[:start], block, page[end:]
+        with open(os.path.join(fixtures, 'kinopoisk_film.json'), encoding='utf-8') as f:
+            self.kinopoisk = json.load(f)
+        with open(os.path.join(fixtures, 'omdb_film.json'), encoding='utf-8') as f:
+            self.omdb = json.load(f)
+
+    def search_page(self, kp_id: int, name_ru: str) -> str:
+        block = self.block.format(id=kp_id, name_ru=html.escape(name_ru), name=f'Film {kp_id}')
+        return self.page_head + block + self.page_tail
+
+    def kinopoisk_film(self, kp_id: int) -> dict:
+        film = copy.deepcopy(self.kinopoisk)
+        film.update(kinopoiskId=kp_id, imdbId=f'tt{kp_id:07d}', nameRu=f'Фильм {kp_id}',
+                    nameOriginal=f'Film {kp_id}', webUrl=f'https://www.kinopoisk.ru/film/{kp_id}/')
+        return film
+
+    def omdb_film(self, imdb_id: str) -> dict:
+        return {**self.omdb, 'imdbID': imdb_id, 'Title': f'Film {int(imdb_id[2:])}'}
+
+
+def upstream_of(path: str) -> str | None:
+    if path == '/index.php':
+        return 'kinopoisk'
+    if path.startswith('/api/'):
+        return 'kinopoisk_api'
+    if path == '/':
+        return 'omdb'
+    return None
+
+
+def per_upstream(values: list[str], default: float = 0.0) -> dict[str, float]:
+    """'0.05' -- для всех API, 'omdb=0.3' -- для одного; последнее значение побеждает."""
+    result = dict.fromkeys(UPSTREAMS, default)
+    for value in values:
+        name, _, number = value.rpartition('=')
+        if name and name not in UPSTREAMS:
+            raise ValueError(f'unknown upstream {name!r}, expected one of {UPSTREAMS}')
+        for upstream in ([name] if name else UPSTREAMS):
+            result[upstream] = float(number)
+    return result
+
+
+def make_app(latency: float | dict[str, float] = 0.05, jitter: dict[str, float] | None = None,
+             errors: dict[str, float] | None = None, error_status: int = 503, seed: int = 0,
+             replay: bool = False) -> web.Application:
+    """Приложение заглушки; задержки и ошибки задаются словарями по внешним API.
+
+    latency -- постоянная задержка, jitter -- средняя случайная добавка к ней
+    (экспоненциальный хвост), errors -- доля ответов с кодом error_status.
+    """
+    if not isinstance(latency, dict):
+        latency = dict.fromkeys(UPSTREAMS, latency)
+    jitter = jitter or {}
+    errors = errors or {}
+    recorded = Replay() if replay else None
+    hits: Counter[str] = Counter()
+    injected: Counter[str] = Counter()
+
+    @web.middleware
+    async def count_and_delay(request: web.Request, handler):
+        path = request.path if not request.path.startswith('/api/v2.2/films/') else '/api/v2.2/films/{id}'
+        hits[path] += 1
+        upstream = upstream_of(request.path)
+        if upstream is None:
+            return await handler(request)
+        # один и тот же запрос с тем же номером повтора получает ту же задержку и ошибку
+        rng = random.Random(f'{seed}:{request.path_qs}:{hits[path]}')
+        delay = latency.get(upstream, 0.0)
+        if jitter.get(upstream):
+            delay += rng.expovariate(1 / jitter[upstream])
+        if delay:
+            await asyncio.sleep(delay)
+        if rng.random() < errors.get(upstream, 0.0):
+            injected[upstream] += 1
+            return web.Response(status=error_status, headers={'Retry-After': '1'} if error_status == 429 else None)
+        return await handler(request)
+
+    async def kinopoisk_search(request: web.Request) -> web.Response:
+        query = request.query.get('kp_query', '')
+        kp_id = film_id(query)
+        if recorded is not None:
+            page = recorded.search_page(kp_id, query)
+        else:
+            page = SEARCH_PAGE.format(id=kp_id, name_ru=html.escape(query), name=f'Film {kp_id}')
+        return web.Response(text=page, content_type='text/html')
+
+    async def kinopoisk_details(request: web.Request) -> web.Response:
+        kp_id = int(request.match_info['kp_id'])
+        return web.json_response(recorded.kinopoisk_film(kp_id) if recorded is not None else kinopoisk_film(kp_id))
+
+    async def kinopoisk_keyword(request: web.Request) -> web.Response:
+        kp_id = film_id(request.query.get('keyword', ''))
+        return web.json_response({'films': [{'filmId': kp_id, 'nameEn': f'Film {kp_id}', 'nameRu': f'Фильм {kp_id}'}]})
+
+    async def omdb(request: web.Request) -> web.Response:
+        if 'i' in request.query:
+            imdb_id = request.query['i']
+            return web.json_response(recorded.omdb_film(imdb_id) if recorded is not None else omdb_film(imdb_id))
+        title = request.query.get('s', '')
+        digits = ''.join(ch for ch in title if ch.isdigit())
+        imdb_id = f'tt{int(digits) if digits else film_id(title):07d}'
+        return web.json_response({'Response': 'True', 'Search': [{'imdbID': imdb_id, 'Title': title}]})
+
+    async def stats(_: web.Request) -> web.Response:
+        return web.json_response({'hits': hits, 'errors': injected})
+
+    app = web.Application(middlewares=[count_and_delay])
+    app.router.add_get('/index.php', kinopoisk_search)
+    app.router.add_get('/api/v2.2/films/{kp_id:\\d+}', kinopoisk_details)
+    app.router.add_get('/api/v2.1/films/search-by-keyword', kinopoisk_keyword)
+    app.router.add_get('/', omdb)
+    app.router.add_get('/stub/stats', stats)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', action='append', default=[],
+                        help='задержка ответа, секунды: 0.05 или omdb=0.3 (0.05)')
+    parser.add_argument('--jitter', action='append', default=[], help='средняя случайная добавка к задержке')
+    parser.add_argument('--errors', action='append', default=[], help='доля ответов с ошибкой: 0.1 или omdb=0.1')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--replay', action='store_true', help='отвечать записанными страницей и JSON')
+    args = parser.parse_args()
+    app = make_app(per_upstream(args.latency, 0.05), per_upstream(args.jitter), per_upstream(args.errors),
+                   args.error_status, args.seed, args.replay)
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+"""Общая часть сайта и бота: запросы к внешним API, кэш, лимиты, пулы и поиск фильма.
+
+Модули импортируются по отдельности (from core.search import search_film),
+тяжелые зависимости вроде telebot подгружаются только там, где нужны.
+Настройки читаются из переменных окружения при импорте модулей, поэтому
+.env, если установлен python-dotenv, загружается здесь, до них.
+"""
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    pass
+else:
+    load_dotenv()
@@ -0,0 +1,181 @@
+"""Выученные соответствия запрос → фильм на Кинопоиске.
+
+Успешный поиск запоминает, какой фильм нашелся по ключу запроса
+(core.normalize.query_key), и другие написания с тем же ключом находят
+фильм словарем в памяти, без кэша в SQLite и без сети. При запуске
+соответствия загружаются из таблицы query_aliases и доучиваются по истории
+поиска бота (таблица stats в той же базе): название найденного фильма из
+истории ищется в каталоге.
+
+Соответствие, которое не подтверждалось поиском ALIASES_REVALIDATE секунд,
+не используется: запрос идет обычным путем, и найденный фильм либо
+подтверждает соответствие, либо заменяет его.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any
+
+from core.cache import CACHE_DB_PATH
+from core.catalog import FilmCatalog
+from core.normalize import query_key
+
+ALIASES_ENABLED = os.getenv('ALIASES_ENABLED', '1') == '1'
+ALIASES_SIZE = int(os.getenv('ALIASES_SIZE', '200000'))
+ALIASES_TTL = float(os.getenv('ALIASES_TTL', str(30 * 24 * 60 * 60)))
+ALIASES_REVALIDATE = float(os.getenv('ALIASES_REVALIDATE', str(24 * 60 * 60)))
+ALIASES_HISTORY = int(os.getenv('ALIASES_HISTORY', '100000'))
+
+
+class QueryAliases:
+    """Ключ запроса -> (kp_id, оригинальное название) с LRU в памяти и таблицей в SQLite.
+
+    Соответствие отдается revalidate секунд после того, как его выучили или
+    подтвердили поиском, и хранится ttl секунд; в памяти держится не больше
+    max_size ключей.
+    """
+
+    def __init__(self, db_path: str = CACHE_DB_PATH, max_size: int = ALIASES_SIZE, ttl: float = ALIASES_TTL,
+                 revalidate: float = ALIASES_REVALIDATE, enabled: bool = ALIASES_ENABLED) -> None:
+        self.db_path = db_path
+        self.table = 'query_aliases'
+        self.max_size = max_size
+        self.ttl = ttl
+        self.revalidate = min(revalidate, ttl)
+        self.enabled = enabled
+        self.aliases: OrderedDict[str, tuple[str, str | None, float]] = OrderedDict()
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self.counters = {'lookups': 0, 'hits': 0, 'misses': 0, 'expired': 0, 'revalidated': 0, 'learned': 0,
+                         'corrected': 0, 'from_history': 0}
+
+    def get_connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {self.table} '
+                         '(key TEXT PRIMARY KEY, kp_id TEXT NOT NULL, original_title TEXT, learned_at REAL NOT NULL)'
+                         ' WITHOUT ROWID')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: str, kp_id: str, original_title: str | None, learned_at: float) -> None:
+        self.aliases[key] = (kp_id, original_title, learned_at)
+        self.aliases.move_to_end(key)
+        while len(self.aliases) > self.max_size:
+            self.aliases.popitem(last=False)
+
+    def lookup(self, key: str) -> tuple[str, str | None] | None:
+        """Фильм (kp_id, оригинальное название) по ключу запроса или None."""
+        if not self.enabled or not key:
+            return None
+        self.counters['lookups'] += 1
+        alias = self.aliases.get(key)
+        if alias is None:
+            self.counters['misses'] += 1
+            return None
+        if time.time() - alias[2] >= self.ttl:
+            self.counters['expired'] += 1
+            del self.aliases[key]
+            return None
+        if time.time() - alias[2] >= self.revalidate:
+            # пусть поиск подтвердит или исправит соответствие, см. learn
+            self.counters['revalidated'] += 1
+            return None
+        self.aliases.move_to_end(key)
+        self.counters['hits'] += 1
+        return alias[0], alias[1]
+
+    def _db_save(self, rows: list[tuple[str, str, str | None, float]]) -> None:
+        with self._lock:
+            conn = self.get_connection()
+            conn.executemany(f'INSERT OR REPLACE INTO {self.table} (key, kp_id, original_title, learned_at) '
+                             'VALUES (?, ?, ?, ?)', rows)
+            conn.commit()
+
+    async def learn(self, key: str, kp_id: str, original_title: str | None) -> None:
+        """Запоминает, что по ключу нашелся фильм, или исправляет прежнее соответствие.
+
+        Результат, отданный самим соответствием, его не продлевает: продлевает
+        только поиск после revalidate.
+        """
+        if not self.enabled or not key:
+            return
+        now = time.time()
+        alias = self.aliases.get(key)
+        if alias is not None and alias[:2] == (kp_id, original_title) and now - alias[2] < self.revalidate:
+            return
+        if alias is not None and alias[:2] != (kp_id, original_title):
+            self.counters['corrected'] += 1
+        self._remember(key, kp_id, original_title, now)
+        self.counters['learned'] += 1
+        try:
+            await asyncio.to_thread(self._db_save, [(key, kp_id, original_title, now)])
+        except sqlite3.Error:
+            pass
+
+    def _db_load(self) -> int:
+        with self._lock:
+            rows = self.get_connection().execute(
+                f'SELECT key, kp_id, original_title, learned_at FROM {self.table} WHERE learned_at >= ? '
+                'ORDER BY learned_at DESC LIMIT ?', (time.time() - self.ttl, self.max_size)).fetchall()
+        for row in reversed(rows):
+            self._remember(*row)
+        return len(rows)
+
+    def _db_history(self) -> list[tuple[str, str, int]]:
+        """(запрос, название найденного фильма, сколько раз) из последних ALIASES_HISTORY записей истории бота."""
+        with self._lock:
+            conn = self.get_connection()
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats'").fetchone() is None:
+                return []
+            last = conn.execute('SELECT max(id) FROM stats').fetchone()[0] or 0
+            return conn.execute('SELECT query, original_title, count(*) FROM stats WHERE id > ? '
+                                "AND original_title NOT IN ('', 'Не найдено') GROUP BY query, original_title",
+                                (last - ALIASES_HISTORY,)).fetchall()
+
+    def learn_history(self, history: list[tuple[str, str, int]], catalog: FilmCatalog) -> list[tuple]:
+        """Соответствия для еще неизвестных ключей: фильм, который чаще всего находился по ключу."""
+        votes: dict[str, Counter[tuple[str, str]]] = {}
+        for query, title, count in history:
+            key = query_key(query or '')
+            film = catalog.exact(title)
+            if key and film is not None and key not in self.aliases:
+                votes.setdefault(key, Counter())[film] += count
+        now = time.time()
+        rows = []
+        for key, films in votes.items():
+            ranked = films.most_common(2)
+            # по одному ключу находились разные фильмы поровну -- не угадываем
+            if len(ranked) > 1 and ranked[1][1] == ranked[0][1]:
+                continue
+            (kp_id, original_title), _ = ranked[0]
+            self._remember(key, kp_id, original_title, now)
+            rows.append((key, kp_id, original_title, now))
+        self.counters['from_history'] += len(rows)
+        return rows
+
+    async def load(self, catalog: FilmCatalog) -> int:
+        """Загружает соответствия и доучивает их по истории бота; каталог должен быть уже загружен."""
+        if not self.enabled:
+            return 0
+        try:
+            loaded = await asyncio.to_thread(self._db_load)
+            rows = self.learn_history(await asyncio.to_thread(self._db_history), catalog)
+            if rows:
+                await asyncio.to_thread(self._db_save, rows)
+        except sqlite3.Error:
+            return len(self.aliases)
+        return loaded + len(rows)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.counters['lookups']
+        return {**self.counters, 'size': len(self.aliases), 'max_size': self.max_size,
+                'hit_rate': round(self.counters['hits'] / lookups, 4) if lookups else 0.0}
+
+
+ALIASES = QueryAliases()
@@ -0,0 +1,169 @@
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from core.rate_limit import LIMITS, UpstreamUnavailable
+
+BREAKER_ENABLED = os.getenv('BREAKER_ENABLED', '1') == '1'
+BREAKER_WINDOW = int(os.getenv('BREAKER_WINDOW', '50'))
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', '10'))
+BREAKER_ERROR_RATE = float(os.getenv('BREAKER_ERROR_RATE', '0.5'))
+BREAKER_SLOW_CALL = float(os.getenv('BREAKER_SLOW_CALL', '3'))
+BREAKER_SLOW_RATE = float(os.getenv('BREAKER_SLOW_RATE', '0.8'))
+BREAKER_OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', '30'))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv('BREAKER_HALF_OPEN_CALLS', '2'))
+
+HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', '0') == '1'
+HEDGE_QUANTILE = float(os.getenv('HEDGE_QUANTILE', '0.95'))
+HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', '0.05'))
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+HEDGE_MAX_RATIO = float(os.getenv('HEDGE_MAX_RATIO', '0.1'))
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(UpstreamUnavailable):
+    def __init__(self, upstream: str) -> None:
+        super().__init__(upstream, 'circuit open')
+
+
+class Call:
+    """Попытка запроса через предохранитель; без ok исход не засчитывается."""
+    __slots__ = ('started', 'ok')
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.ok: bool | None = None
+
+
+class CircuitBreaker:
+    """Предохранитель внешнего API по последним window попыткам.
+
+    Размыкается, если среди них не меньше min_calls и доля ошибок (5xx,
+    429, сетевые ошибки) или медленных попыток (дольше slow_call секунд)
+    достигла порога. Разомкнутый сразу отказывает с CircuitOpen, через
+    open_seconds пропускает half_open_calls пробных запросов: если все
+    успешны -- замыкается, при первой неудаче снова размыкается.
+
+    Заодно хранит время успешных ответов: по нему считается задержка, после
+    которой имеет смысл отправить дублирующий запрос.
+    """
+
+    def __init__(self, name: str, window: int = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 error_rate: float = BREAKER_ERROR_RATE, slow_call: float = BREAKER_SLOW_CALL,
+                 slow_rate: float = BREAKER_SLOW_RATE, open_seconds: float = BREAKER_OPEN_SECONDS,
+                 half_open_calls: int = BREAKER_HALF_OPEN_CALLS, enabled: bool = BREAKER_ENABLED) -> None:
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.enabled = enabled
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes = 0
+        self.probe_successes = 0
+        # (ошибка, медленная) по последним попыткам
+        self.outcomes: deque[tuple[bool, bool]] = deque(maxlen=window)
+        self.latencies: deque[float] = deque(maxlen=200)
+        self.counters = {'calls': 0, 'failures': 0, 'slow': 0, 'rejected': 0, 'trips': 0,
+                         'requests': 0, 'hedges': 0, 'hedge_wins': 0}
+
+    def _admit(self) -> bool:
+        if not self.enabled or self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                return False
+            self.state, self.probes, self.probe_successes = HALF_OPEN, 0, 0
+        if self.probes >= self.half_open_calls:
+            return False
+        self.probes += 1
+        return True
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.counters['trips'] += 1
+
+    def _record(self, ok: bool | None, elapsed: float, probe: bool) -> None:
+        slow = elapsed >= self.slow_call
+        if ok is None:
+            # отмена или отказ до запроса: считается, только если попытка уже затянулась
+            if not slow:
+                if probe:
+                    self.probes -= 1
+                return
+            ok = False
+        failed = not ok
+        self.counters['calls'] += 1
+        self.counters['failures'] += failed
+        self.counters['slow'] += slow
+        if ok:
+            self.latencies.append(elapsed)
+        if probe and self.state == HALF_OPEN:
+            if failed or slow:
+                self._open()
+                return
+            self.probe_successes += 1
+            if self.probe_successes >= self.half_open_calls:
+                self.state = CLOSED
+                self.outcomes.clear()
+            return
+        self.outcomes.append((failed, slow))
+        if self.state == CLOSED and self.enabled and len(self.outcomes) >= self.min_calls:
+            failures = sum(failed for failed, _ in self.outcomes)
+            slow_calls = sum(slow for _, slow in self.outcomes)
+            if failures >= self.error_rate * len(self.outcomes) or slow_calls >= self.slow_rate * len(self.outcomes):
+                self._open()
+
+    @contextmanager
+    def call(self) -> Iterator[Call]:
+        """Попытка запроса: CircuitOpen, если предохранитель разомкнут.
+
+        Код внутри выставляет call.ok (True -- API ответило, False -- ошибка
+        API) и может сдвинуть call.started, например после ожидания лимита.
+        """
+        if not self._admit():
+            self.counters['rejected'] += 1
+            raise CircuitOpen(self.name)
+        probe = self.state == HALF_OPEN
+        call = Call()
+        try:
+            yield call
+        finally:
+            self._record(call.ok, time.monotonic() - call.started, probe)
+
+    def hedge_delay(self) -> float | None:
+        """Через сколько секунд дублировать запрос: квантиль HEDGE_QUANTILE времени ответа.
+
+        None -- дублирование выключено, данных мало или исчерпана доля
+        дублирующих запросов.
+        """
+        if not HEDGE_ENABLED or self.state != CLOSED or len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        if self.counters['hedges'] >= HEDGE_MAX_RATIO * self.counters['requests']:
+            return None
+        ordered = sorted(self.latencies)
+        return max(HEDGE_MIN_DELAY, ordered[min(len(ordered) - 1, int(len(ordered) * HEDGE_QUANTILE))])
+
+    def stats(self) -> dict[str, Any]:
+        failures = sum(failed for failed, _ in self.outcomes)
+        slow_calls = sum(slow for _, slow in self.outcomes)
+        window = len(self.outcomes) or 1
+        hedge_delay = self.hedge_delay()
+        return {**self.counters, 'state': self.state, 'state_code': STATE_CODES[self.state],
+                'window_error_rate': round(failures / window, 3), 'window_slow_rate': round(slow_calls / window, 3),
+                'hedge_delay_ms': round(hedge_delay * 1000, 1) if hedge_delay is not None else 0}
+
+
+BREAKERS = {name: CircuitBreaker(name) for name in LIMITS}
+
+
+def breaker_stats() -> dict[str, dict[str, Any]]:
+    return {name: breaker.stats() for name, breaker in BREAKERS.items()}
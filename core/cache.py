@@ -0,0 +1,358 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable
+
+from core.film import FilmRecord
+from core.rate_limit import BACKGROUND, PRIORITY
+from core.tracing import span
+
+CACHE_DB_PATH = os.getenv('CACHE_DB_PATH', '/app/data/MovieData.db')
+CACHE_SIZE = int(os.getenv('CACHE_SIZE', '2048'))
+CACHE_TTL = float(os.getenv('CACHE_TTL', str(6 * 60 * 60)))
+CACHE_STALE_TTL = float(os.getenv('CACHE_STALE_TTL', str(7 * 24 * 60 * 60)))
+# устаревшие записи удаляются из SQLite раз в столько записей
+CACHE_EXPIRE_EVERY = int(os.getenv('CACHE_EXPIRE_EVERY', '1000'))
+CACHE_LEASES = os.getenv('CACHE_LEASES', '1') == '1'
+CACHE_LEASE_SECONDS = float(os.getenv('CACHE_LEASE_SECONDS', '15'))
+CACHE_LEASE_WAIT = float(os.getenv('CACHE_LEASE_WAIT', '10'))
+CACHE_LEASE_POLL = float(os.getenv('CACHE_LEASE_POLL', '0.05'))
+
+# задается фоновой предвыборкой: записи старше стольких секунд загружаются заново,
+# а ее обращения не попадают в статистику попаданий
+REFRESH_AHEAD: ContextVar[float | None] = ContextVar('REFRESH_AHEAD', default=None)
+
+
+def _not_empty(value: Any) -> bool:
+    return value is not None
+
+
+class FilmCache:
+    """Двухуровневый кэш: LRU в памяти процесса и таблица в SQLite.
+
+    Запись считается свежей CACHE_TTL секунд, после этого до CACHE_STALE_TTL
+    она отдается как есть, а обновление запускается в фоне.
+
+    Несколько процессов (воркеры gunicorn, бот) делят таблицу в SQLite. Чтобы
+    они не загружали одну и ту же запись одновременно, перед загрузкой
+    процесс берет аренду ключа в таблице film_cache_leases на
+    CACHE_LEASE_SECONDS; остальные до CACHE_LEASE_WAIT секунд ждут, пока
+    запись появится в SQLite, и загружают сами, только если не дождались.
+    Аренду своего же процесса не ждут (одинаковые загрузки внутри процесса
+    объединяет SingleFlight), а интерактивный запрос перехватывает аренду
+    у фоновой загрузки: пользователь не ждет предвыборку с ее бюджетом.
+
+    Для записей, загруженных предвыборкой, запоминается, когда запись была
+    бы сохранена без нее: если тогда пользователь получил бы промах или
+    устаревшую запись, попадание засчитывается в prefetch_hits.
+    """
+
+    def __init__(self, db_path: str = CACHE_DB_PATH, max_size: int = CACHE_SIZE,
+                 ttl: float = CACHE_TTL, stale_ttl: float = CACHE_STALE_TTL) -> None:
+        self.db_path = db_path
+        self.table = 'film_cache'
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.memory: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self.counters = {
+            'lookups': 0, 'fresh_hits': 0, 'memory_hits': 0, 'sqlite_hits': 0, 'misses': 0, 'stale_hits': 0,
+            'evictions': 0, 'refreshes': 0, 'refresh_errors': 0, 'prefetched': 0, 'prefetch_hits': 0,
+            'lease_waits': 0, 'lease_hits': 0, 'lease_misses': 0,
+        }
+        # ключ записи из предвыборки -> когда запись была бы сохранена без предвыборки (None -- не было бы)
+        self.prefetched: OrderedDict[str, float | None] = OrderedDict()
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._refreshing: dict[str, asyncio.Task] = {}
+        # в контейнерах pid может совпасть, поэтому владелец аренды -- хост и pid
+        self._writes = 0
+        self._owner = f'{socket.gethostname()}:{os.getpid()}'
+
+    def get_connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {self.table} '
+                         '(key TEXT PRIMARY KEY, value TEXT, stored_at REAL)')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_stored_at ON {self.table} (stored_at)')
+            columns = [row[1] for row in conn.execute(f'PRAGMA table_info({self.table}_leases)')]
+            if columns and 'priority' not in columns:
+                # аренды живут секунды: таблицу без приоритета проще пересоздать
+                conn.execute(f'DROP TABLE {self.table}_leases')
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {self.table}_leases '
+                         '(key TEXT PRIMARY KEY, owner TEXT, priority INTEGER NOT NULL DEFAULT 0, expires_at REAL)')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _db_get(self, key: str) -> tuple[Any, float] | None:
+        with self._lock:
+            row = self.get_connection().execute(
+                f'SELECT value, stored_at FROM {self.table} WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            value = FilmRecord.from_bytes(row[0]) if isinstance(row[0], bytes) else json.loads(row[0])
+        except (ValueError, struct.error):
+            # запись старого формата или поврежденная -- промах, ее заменит свежая
+            with self._lock:
+                conn = self.get_connection()
+                conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                conn.commit()
+            return None
+        return value, row[1]
+
+    def _db_set(self, key: str, value: Any, stored_at: float) -> None:
+        with self._lock:
+            conn = self.get_connection()
+            # записи фильмов -- в двоичном виде, остальное -- JSON
+            data = value.to_bytes() if isinstance(value, FilmRecord) else json.dumps(value, ensure_ascii=False)
+            conn.execute(f'INSERT OR REPLACE INTO {self.table} (key, value, stored_at) VALUES (?, ?, ?)',
+                         (key, data, stored_at))
+            self._writes += 1
+            if self._writes % CACHE_EXPIRE_EVERY == 0:
+                conn.execute(f'DELETE FROM {self.table} WHERE stored_at < ?', (stored_at - self.stale_ttl,))
+            # запись сохранена -- аренда ключа больше не нужна
+            conn.execute(f'DELETE FROM {self.table}_leases WHERE key = ?', (key,))
+            conn.commit()
+
+    def _db_lease(self, key: str, priority: int) -> str | None:
+        """Берет аренду ключа, если ее нет, она истекла или ее держит менее важная загрузка.
+
+        None -- аренда взята, иначе владелец чужой аренды.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self.get_connection()
+            cursor = conn.execute(
+                f'INSERT INTO {self.table}_leases (key, owner, priority, expires_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, priority = excluded.priority, '
+                'expires_at = excluded.expires_at WHERE expires_at < ? OR priority > excluded.priority',
+                (key, self._owner, priority, now + CACHE_LEASE_SECONDS, now))
+            row = None
+            if cursor.rowcount == 0:
+                row = conn.execute(f'SELECT owner FROM {self.table}_leases WHERE key = ?', (key,)).fetchone()
+            conn.commit()
+        return row[0] if row is not None else None
+
+    def _db_release(self, key: str, priority: int) -> None:
+        with self._lock:
+            conn = self.get_connection()
+            conn.execute(f'DELETE FROM {self.table}_leases WHERE key = ? AND owner = ? AND priority = ?',
+                         (key, self._owner, priority))
+            conn.commit()
+
+    def _db_peek(self, key: str) -> tuple[tuple[Any, float] | None, bool]:
+        """Запись из SQLite и держит ли кто-то аренду ее ключа."""
+        entry = self._db_get(key)
+        with self._lock:
+            row = self.get_connection().execute(
+                f'SELECT expires_at FROM {self.table}_leases WHERE key = ?', (key,)).fetchone()
+        return entry, row is not None and row[0] >= time.time()
+
+    def _remember(self, key: str, value: Any, stored_at: float) -> None:
+        self.memory[key] = (value, stored_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def _count(self, name: str) -> None:
+        if REFRESH_AHEAD.get() is None:
+            self.counters[name] += 1
+
+    async def get(self, key: str) -> tuple[Any, float] | None:
+        """Ищет запись сначала в памяти, затем в SQLite."""
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+            self._count('memory_hits')
+            return entry
+        try:
+            with span('cache_sqlite_get'):
+                entry = await asyncio.to_thread(self._db_get, key)
+        except sqlite3.Error:
+            entry = None
+        if entry is not None:
+            self._count('sqlite_hits')
+            self._remember(key, *entry)
+        return entry
+
+    async def set(self, key: str, value: Any) -> None:
+        stored_at = time.time()
+        self._remember(key, value, stored_at)
+        try:
+            with span('cache_sqlite_set'):
+                await asyncio.to_thread(self._db_set, key, value, stored_at)
+        except sqlite3.Error:
+            pass
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]],
+                           should_store: Callable[[Any], bool] = _not_empty) -> Any:
+        """Возвращает значение из кэша или загружает его через fetch.
+
+        При предвыборке (задан REFRESH_AHEAD) запись загружается заново, если
+        ей больше REFRESH_AHEAD секунд, даже когда она еще свежая.
+        """
+        refresh_ahead = REFRESH_AHEAD.get()
+        entry = await self.get(key)
+        if refresh_ahead is None:
+            self.counters['lookups'] += 1
+            self._check_prefetched(key, entry)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if refresh_ahead is not None:
+                if age < refresh_ahead:
+                    return value
+            elif age < self.ttl:
+                self.counters['fresh_hits'] += 1
+                return value
+            elif age < self.stale_ttl:
+                self.counters['stale_hits'] += 1
+                self._schedule_refresh(key, fetch, should_store)
+                return value
+        self._count('misses')
+        holder = await self._lease(key)
+        # аренду этого же процесса не ждем: одинаковые загрузки здесь объединяет SingleFlight
+        if holder is not None and holder != self._owner:
+            peer_entry = await self._wait_for_peer(key)
+            if peer_entry is not None:
+                return peer_entry[0]
+        stored = False
+        try:
+            value = await fetch()
+            if should_store(value):
+                if refresh_ahead is not None:
+                    self._mark_prefetched(key, entry[1] if entry is not None else None)
+                else:
+                    self.prefetched.pop(key, None)
+                await self.set(key, value)
+                stored = True
+        finally:
+            if holder is None and not stored:
+                await self._release(key)
+        return value
+
+    async def _lease(self, key: str) -> str | None:
+        """None -- ключ загружает этот запрос (в том числе без аренд или без SQLite), иначе владелец аренды."""
+        if not CACHE_LEASES:
+            return None
+        try:
+            return await asyncio.to_thread(self._db_lease, key, PRIORITY.get())
+        except sqlite3.Error:
+            return None
+
+    async def _release(self, key: str) -> None:
+        if not CACHE_LEASES:
+            return
+        try:
+            await asyncio.to_thread(self._db_release, key, PRIORITY.get())
+        except sqlite3.Error:
+            pass
+
+    async def _wait_for_peer(self, key: str) -> tuple[Any, float] | None:
+        """Ждет, пока другой процесс сохранит свежую запись; None -- не дождались."""
+        self.counters['lease_waits'] += 1
+        deadline = time.monotonic() + CACHE_LEASE_WAIT
+        with span('cache_lease_wait'):
+            while time.monotonic() < deadline:
+                await asyncio.sleep(CACHE_LEASE_POLL)
+                try:
+                    entry, leased = await asyncio.to_thread(self._db_peek, key)
+                except sqlite3.Error:
+                    break
+                if entry is not None and time.time() - entry[1] < self.ttl:
+                    self.counters['lease_hits'] += 1
+                    self._remember(key, *entry)
+                    return entry
+                if not leased:
+                    # аренду сняли без записи: загрузка не удалась или значение не сохраняется
+                    break
+        self.counters['lease_misses'] += 1
+        return None
+
+    def _mark_prefetched(self, key: str, previous_stored_at: float | None) -> None:
+        self.counters['prefetched'] += 1
+        if key not in self.prefetched:
+            self.prefetched[key] = previous_stored_at
+        self.prefetched.move_to_end(key)
+        while len(self.prefetched) > self.max_size:
+            self.prefetched.popitem(last=False)
+
+    def _check_prefetched(self, key: str, entry: tuple[Any, float] | None) -> None:
+        """Обращение пользователя к записи из предвыборки: был бы без нее промах или устаревшая запись."""
+        if key not in self.prefetched:
+            return
+        now = time.time()
+        if entry is None or now - entry[1] >= self.ttl:
+            # предвыборка не успела, запись обновит сам запрос пользователя
+            del self.prefetched[key]
+            return
+        stored_at = self.prefetched[key]
+        if stored_at is None or now - stored_at >= self.ttl:
+            self.counters['prefetch_hits'] += 1
+            # без предвыборки запись загрузилась бы сейчас
+            self.prefetched[key] = now
+
+    def _schedule_refresh(self, key: str, fetch: Callable[[], Awaitable[Any]],
+                          should_store: Callable[[Any], bool]) -> None:
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(key, fetch, should_store))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(self, key: str, fetch: Callable[[], Awaitable[Any]],
+                       should_store: Callable[[Any], bool]) -> None:
+        PRIORITY.set(BACKGROUND)
+        try:
+            entry = await asyncio.to_thread(self._db_get, key)
+        except sqlite3.Error:
+            entry = None
+        if entry is not None and time.time() - entry[1] < self.ttl:
+            # другой процесс уже обновил запись
+            self._remember(key, *entry)
+            return
+        holder = await self._lease(key)
+        if holder is not None:
+            # запись уже обновляет другой процесс или этот же
+            if holder != self._owner:
+                await self._wait_for_peer(key)
+            return
+        self.counters['refreshes'] += 1
+        stored = False
+        try:
+            value = await fetch()
+            if should_store(value):
+                self.prefetched.pop(key, None)
+                await self.set(key, value)
+                stored = True
+        except Exception:
+            self.counters['refresh_errors'] += 1
+        finally:
+            if not stored:
+                await self._release(key)
+
+    def stats(self) -> dict[str, Any]:
+        stats: dict[str, Any] = dict(self.counters)
+        stats['size'] = len(self.memory)
+        stats['max_size'] = self.max_size
+        stats['refreshing'] = len(self._refreshing)
+        lookups = self.counters['lookups']
+        # доля обращений со свежей записью и сколько из нее добавила предвыборка
+        stats['hit_rate'] = round(self.counters['fresh_hits'] / lookups, 4) if lookups else 0.0
+        stats['prefetch_uplift'] = round(self.counters['prefetch_hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+FILM_CACHE = FilmCache()
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Any
+
+from core.cache import CACHE_DB_PATH
+from core.film import FilmRecord
+from core.normalize import fold
+
+CATALOG_MIN_SCORE = float(os.getenv('CATALOG_MIN_SCORE', '0.9'))
+CATALOG_ENABLED = os.getenv('CATALOG_ENABLED', '1') == '1'
+
+_DIGITS = re.compile(r'\d+')
+
+
+def _contains(posting: array, position: int) -> bool:
+    i = bisect_left(posting, position)
+    return i < len(posting) and posting[i] == position
+
+
+def trigrams(folded: str) -> set[str]:
+    padded = f'  {folded} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FilmCatalog:
+    """Локальный каталог фильмов с нечетким поиском по названиям.
+
+    Каждое название (nameRu, nameOriginal, nameEn, Title из OMDb) разбивается
+    на триграммы, по ним строится инвертированный индекс. Поиск ранжирует
+    кандидатов по коэффициенту Дайса; чтобы не перебирать длинные списки
+    частых триграмм, кандидаты берутся только из самых редких триграмм
+    запроса -- для порога min_score этого достаточно.
+
+    search и lookup вызываются из потока (asyncio.to_thread) без блокировки:
+    add дописывает позиции в конец списков и заполняет _name_grams раньше
+    индекса, поэтому поток видит название либо целиком, либо никак.
+    """
+
+    def __init__(self, db_path: str = CACHE_DB_PATH, min_score: float = CATALOG_MIN_SCORE) -> None:
+        self.db_path = db_path
+        self.table = 'film_catalog'
+        self.min_score = min_score
+        self.films: dict[str, tuple[str, str]] = {}
+        self._names: list[str] = []
+        self._name_film: list[str] = []
+        self._name_grams: array = array('H')
+        self._film_names: dict[str, list[int]] = {}
+        self._exact: dict[str, int] = {}
+        self._postings: dict[str, array] = {}
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self.counters = {'lookups': 0, 'local_hits': 0, 'misses': 0}
+
+    def get_connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {self.table} '
+                         '(kp_id TEXT PRIMARY KEY, title TEXT, year TEXT, names TEXT, updated_at REAL)')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _index_name(self, kp_id: str, name: str) -> bool:
+        folded = fold(name)
+        positions = self._film_names.setdefault(kp_id, [])
+        if not folded or any(self._names[i] == folded for i in positions):
+            return False
+        grams = trigrams(folded)
+        position = len(self._names)
+        self._names.append(folded)
+        self._name_film.append(kp_id)
+        self._name_grams.append(min(len(grams), 65535))
+        positions.append(position)
+        # одно и то же название у разных фильмов -- точное совпадение неоднозначно
+        self._exact[folded] = position if folded not in self._exact else -1
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                posting = self._postings[gram] = array('I')
+            posting.append(position)
+        return True
+
+    def add(self, kp_id: Any, title: str, year: str, names: list[str | None]) -> bool:
+        """Добавляет фильм и его названия; возвращает True, если появилось что-то новое."""
+        kp_id = str(kp_id)
+        names = [name for name in names if name]
+        with self._lock:
+            is_new = self.films.get(kp_id) != (title, year)
+            self.films[kp_id] = (title, year)
+            for name in names:
+                is_new = self._index_name(kp_id, name) or is_new
+        return is_new
+
+    def add_film(self, film: FilmRecord) -> bool:
+        title = film.original_title or next(iter(film.names), '')
+        return self.add(film.kinopoisk_id, title, film.year if film.year.isdigit() else '', list(film.names))
+
+    def search(self, query: str, limit: int = 5, min_score: float | None = None) -> list[tuple[float, str, str]]:
+        """Возвращает до limit пар (оценка, kp_id, название) с оценкой не ниже min_score."""
+        min_score = self.min_score if min_score is None else min_score
+        folded = fold(query)
+        if not folded:
+            return []
+        position = self._exact.get(folded)
+        if position is not None and position >= 0:
+            kp_id = self._name_film[position]
+            return [(1.0, kp_id, self.films[kp_id][0])]
+
+        grams = trigrams(folded)
+        postings = sorted((self._postings.get(gram, array('I')) for gram in grams), key=len)
+        # общих триграмм должно быть не меньше need, значит кандидат есть хотя бы
+        # в одном из rare самых редких списков; длинные списки только досчитываются
+        need = math.ceil(min_score * len(grams) / (2 - min_score))
+        rare = len(grams) - need + 1
+        shared: Counter[int] = Counter()
+        for posting in postings[:rare]:
+            shared.update(posting)
+        rest = postings[rare:]
+        half_score = min_score / 2
+        candidates = [
+            position for position, count in shared.items()
+            if count + len(rest) >= half_score * (len(grams) + self._name_grams[position])
+        ]
+        # списки от редких к частым: после каждого отбрасываются кандидаты, которым
+        # уже не набрать порог даже со всеми оставшимися списками
+        for done, posting in enumerate(rest, 1):
+            if not candidates:
+                break
+            remaining = len(rest) - done
+            kept = []
+            for position in candidates:
+                if _contains(posting, position):
+                    shared[position] += 1
+                if shared[position] + remaining >= half_score * (len(grams) + self._name_grams[position]):
+                    kept.append(position)
+            candidates = kept
+
+        best: dict[str, float] = {}
+        for position in candidates:
+            score = 2 * shared[position] / (len(grams) + self._name_grams[position])
+            kp_id = self._name_film[position]
+            if score >= min_score and score > best.get(kp_id, 0.0):
+                best[kp_id] = score
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(score, kp_id, self.films[kp_id][0]) for kp_id, score in ranked]
+
+    def exact(self, name: str) -> tuple[str, str] | None:
+        """Фильм (kp_id, оригинальное название), у которого ровно такое название, если он один."""
+        position = self._exact.get(fold(name))
+        if position is None or position < 0:
+            return None
+        kp_id = self._name_film[position]
+        return kp_id, self.films[kp_id][0]
+
+    def _digits(self, kp_id: str) -> set[str]:
+        names = ' '.join(self._names[i] for i in self._film_names.get(kp_id, ()))
+        return set(_DIGITS.findall(names)) | {self.films[kp_id][1]}
+
+    def lookup(self, query: str) -> tuple[str, str] | None:
+        """Уверенно найденный фильм (kp_id, оригинальное название) или None.
+
+        Номер части или год из запроса должен встречаться у фильма, иначе легко
+        спутать сиквелы; если подходят два фильма с близкой оценкой, решает сеть.
+        """
+        if not CATALOG_ENABLED:
+            return None
+        self.counters['lookups'] += 1
+        query_digits = set(_DIGITS.findall(query))
+        matches = [(score, kp_id, title) for score, kp_id, title in self.search(query, limit=3)
+                   if query_digits <= self._digits(kp_id)]
+        if matches and (len(matches) == 1 or matches[1][0] < matches[0][0] - 0.05):
+            self.counters['local_hits'] += 1
+            return matches[0][1], matches[0][2]
+        self.counters['misses'] += 1
+        return None
+
+    def _db_save(self, kp_id: str) -> None:
+        title, year = self.films[kp_id]
+        names = [self._names[i] for i in self._film_names.get(kp_id, ())]
+        with self._lock:
+            conn = self.get_connection()
+            conn.execute(f'INSERT OR REPLACE INTO {self.table} (kp_id, title, year, names, updated_at) '
+                         'VALUES (?, ?, ?, ?, ?)', (kp_id, title, year, json.dumps(names, ensure_ascii=False),
+                                                   time.time()))
+            conn.commit()
+
+    async def remember(self, film: FilmRecord | None, extra_names: list[str | None] = ()) -> None:
+        """Добавляет фильм с Кинопоиска (и названия из OMDb) в каталог и сохраняет в SQLite."""
+        if film is None or film.kinopoisk_id is None:
+            return
+        is_new = self.add_film(film)
+        if extra_names:
+            title, year = self.films[film.kinopoisk_id]
+            is_new = self.add(film.kinopoisk_id, title, year, list(extra_names)) or is_new
+        if is_new:
+            try:
+                await asyncio.to_thread(self._db_save, film.kinopoisk_id)
+            except sqlite3.Error:
+                pass
+
+    def _db_load(self) -> int:
+        with self._lock:
+            rows = self.get_connection().execute(f'SELECT kp_id, title, year, names FROM {self.table}').fetchall()
+        for kp_id, title, year, names in rows:
+            self.add(kp_id, title, year, json.loads(names))
+        return len(rows)
+
+    async def load(self) -> int:
+        """Загружает сохраненный каталог в память."""
+        try:
+            return await asyncio.to_thread(self._db_load)
+        except sqlite3.Error:
+            return 0
+
+    def stats(self) -> dict[str, int]:
+        return {**self.counters, 'films': len(self.films), 'names': len(self._names),
+                'trigrams': len(self._postings)}
+
+
+CATALOG = FilmCatalog()
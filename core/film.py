@@ -0,0 +1,186 @@
+"""Запись фильма для карточек и кэша вместо словарей в формате OMDb.
+
+Из ответа Кинопоиска или OMDb берутся только поля, которые нужны карточке
+и каталогу; строки не копируются, остальной ответ Кинопоиска (описания
+кадров, ссылки и т. п.) сразу освобождается. Остальные поля OMDb (Writer,
+Awards, imdbVotes, полный список Ratings и т. п.) хранятся одной строкой
+JSON в omdb_extra: API отдает ответ OMDb целиком. Рейтинги лежат в
+отдельных полях, поэтому карточке не нужно искать их в списке Ratings.
+
+Поля хранят строки в том виде, в каком они выводятся в карточке: для
+отсутствующих значений -- 'N/A' или 'Неизвестно', как раньше в словарях.
+"""
+import json
+import struct
+from typing import Any
+
+FORMAT_VERSION = 2
+_NONE = 0xFFFFFFFF
+_DEFAULT = 0xFFFFFFFE
+_NAMES_SEPARATOR = '\n'
+# ключи OMDb, которые лежат в отдельных полях записи; остальные -- в omdb_extra
+_OMDB_FIELDS = frozenset(('Title', 'Year', 'Rated', 'Runtime', 'Genre', 'Director', 'Actors', 'Plot', 'Poster',
+                          'BoxOffice', 'imdbRating', 'Metascore', 'imdbID'))
+
+
+def _text(value: Any, default: str) -> str:
+    return str(value) if value not in (None, '') else default
+
+
+class FilmRecord:
+    """Фильм для карточки, каталога и кэша."""
+    __slots__ = ('kinopoisk_id', 'imdb_id', 'title', 'original_title', 'names', 'year', 'rated', 'runtime',
+                 'genre', 'director', 'actors', 'plot', 'poster', 'box_office', 'imdb_rating', 'metascore',
+                 'rotten_tomatoes', 'kinopoisk_rating', 'film_critics', 'omdb_extra')
+
+    def __init__(self, kinopoisk_id: str | None = None, imdb_id: str | None = None, title: str = 'Неизвестно',
+                 original_title: str | None = None, names: tuple[str, ...] = (), year: str = '',
+                 rated: str = 'N/A', runtime: str = 'Неизвестно', genre: str = 'Неизвестно',
+                 director: str = 'Неизвестно', actors: str = 'Неизвестно', plot: str = 'Описание отсутствует',
+                 poster: str | None = None, box_office: str = 'N/A', imdb_rating: str = 'N/A',
+                 metascore: str = 'N/A', rotten_tomatoes: str = 'N/A', kinopoisk_rating: str = 'N/A',
+                 film_critics: str = 'N/A', omdb_extra: str | None = None) -> None:
+        self.kinopoisk_id = kinopoisk_id
+        self.imdb_id = imdb_id
+        self.title = title
+        self.original_title = original_title
+        self.names = names
+        self.year = year
+        self.rated = rated
+        self.runtime = runtime
+        self.genre = genre
+        self.director = director
+        self.actors = actors
+        self.plot = plot
+        self.poster = poster
+        self.box_office = box_office
+        self.imdb_rating = imdb_rating
+        self.metascore = metascore
+        self.rotten_tomatoes = rotten_tomatoes
+        self.kinopoisk_rating = kinopoisk_rating
+        self.film_critics = film_critics
+        self.omdb_extra = omdb_extra
+
+    @classmethod
+    def from_kinopoisk(cls, kp: dict) -> 'FilmRecord':
+        """Из ответа kinopoiskapiunofficial.tech /api/v2.2/films/{id}."""
+        name_ru, name_original, name_en = kp.get('nameRu'), kp.get('nameOriginal'), kp.get('nameEn')
+        age_limits = kp.get('ratingAgeLimits')
+        genres = kp.get('genres')
+        return cls(
+            kinopoisk_id=str(kp['kinopoiskId']),
+            title=name_ru or name_original or name_en or 'Неизвестно',
+            original_title=name_original or name_en,
+            names=tuple(name for name in (name_ru, name_original, name_en) if name),
+            year=_text(kp.get('year'), 'N/A'),
+            rated=age_limits.replace('age', '') + '+' if age_limits else 'N/A',
+            runtime=_text(kp.get('filmLength'), 'N/A'),
+            genre=', '.join(g['genre'].capitalize() for g in genres) if genres else 'N/A',
+            director='N/A',
+            actors='N/A',
+            plot=kp.get('description') or kp.get('shortDescription') or 'Описание отсутствует',
+            poster=kp.get('posterUrl') or kp.get('posterUrlPreview') or 'N/A',
+            imdb_rating=_text(kp.get('ratingImdb'), 'N/A'),
+            kinopoisk_rating=f"{kp['ratingKinopoisk']}/10" if kp.get('ratingKinopoisk') else 'N/A',
+            film_critics=f"{kp['ratingFilmCritics']}/10" if kp.get('ratingFilmCritics') else 'N/A',
+        )
+
+    @classmethod
+    def from_omdb(cls, omdb: dict) -> 'FilmRecord':
+        """Из ответа OMDb на запрос по imdbID."""
+        rotten = 'N/A'
+        for rating in omdb.get('Ratings') or ():
+            if rating.get('Source') == 'Rotten Tomatoes':
+                rotten = rating.get('Value', 'N/A')
+        title = omdb.get('Title')
+        extra = {key: value for key, value in omdb.items() if key not in _OMDB_FIELDS}
+        return cls(
+            imdb_id=omdb.get('imdbID'),
+            title=title or 'Неизвестно',
+            original_title=title,
+            names=(title,) if title else (),
+            year=omdb.get('Year', ''),
+            rated=omdb.get('Rated', 'N/A'),
+            runtime=omdb.get('Runtime', 'Неизвестно'),
+            genre=omdb.get('Genre', 'Неизвестно'),
+            director=omdb.get('Director', 'Неизвестно'),
+            actors=omdb.get('Actors', 'Неизвестно'),
+            plot=omdb.get('Plot', 'Описание отсутствует'),
+            poster=omdb.get('Poster'),
+            box_office=omdb.get('BoxOffice', 'N/A'),
+            imdb_rating=omdb.get('imdbRating', 'N/A'),
+            metascore=omdb.get('Metascore', 'N/A'),
+            rotten_tomatoes=rotten,
+            omdb_extra=json.dumps(extra, ensure_ascii=False) if extra else None,
+        )
+
+    def to_omdb(self) -> dict[str, Any]:
+        """Словарь в формате OMDb для ответов API; для записи из OMDb -- исходный ответ."""
+        imdb = f'{self.imdb_rating}/10' if self.imdb_rating != 'N/A' else 'N/A'
+        ratings = [{'Source': source, 'Value': value}
+                   for source, value in (('Internet Movie Database', imdb), ('Rotten Tomatoes', self.rotten_tomatoes),
+                                         ('Kinopoisk', self.kinopoisk_rating), ('Film Critics', self.film_critics))
+                   if value != 'N/A']
+        film = {
+            'Title': self.title, 'Year': self.year, 'Rated': self.rated, 'Runtime': self.runtime,
+            'Genre': self.genre, 'Director': self.director, 'Actors': self.actors, 'Plot': self.plot,
+            'Poster': self.poster or 'N/A', 'Ratings': ratings, 'imdbRating': self.imdb_rating,
+            'Metascore': self.metascore, 'BoxOffice': self.box_office,
+        }
+        if self.imdb_id:
+            film['imdbID'] = self.imdb_id
+        if self.kinopoisk_id:
+            film['kinopoiskId'] = self.kinopoisk_id
+        if self.omdb_extra:
+            film.update(json.loads(self.omdb_extra))
+        return film
+
+    def values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def to_bytes(self) -> bytes:
+        """Компактная запись для SQLite: версия, длины полей в UTF-8 и сами поля подряд.
+
+        Поля со значением по умолчанию не записываются.
+        """
+        lengths, parts = [], []
+        for name, value in zip(self.__slots__, self.values()):
+            if value == _DEFAULTS[name]:
+                lengths.append(_DEFAULT)
+            elif value is None:
+                lengths.append(_NONE)
+            else:
+                part = (_NAMES_SEPARATOR.join(value) if name == 'names' else value).encode()
+                lengths.append(len(part))
+                parts.append(part)
+        return _HEADER.pack(FORMAT_VERSION, *lengths) + b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'FilmRecord':
+        version, *lengths = _HEADER.unpack_from(data)
+        if version != FORMAT_VERSION:
+            raise ValueError(f'Неизвестная версия записи фильма: {version}')
+        fields = {}
+        position = _HEADER.size
+        for name, length in zip(cls.__slots__, lengths):
+            if length == _DEFAULT:
+                continue
+            if length == _NONE:
+                fields[name] = None
+                continue
+            value = data[position:position + length].decode()
+            position += length
+            fields[name] = tuple(value.split(_NAMES_SEPARATOR)) if name == 'names' else value
+        return cls(**fields)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FilmRecord):
+            return NotImplemented
+        return self.values() == other.values()
+
+    def __repr__(self) -> str:
+        return f'FilmRecord(kinopoisk_id={self.kinopoisk_id!r}, imdb_id={self.imdb_id!r}, title={self.title!r})'
+
+
+_DEFAULTS = dict(zip(FilmRecord.__slots__, FilmRecord.__init__.__defaults__))
+_HEADER = struct.Struct(f'<B{len(FilmRecord.__slots__)}I')
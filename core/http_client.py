@@ -0,0 +1,94 @@
+import os
+import aiohttp
+
+HTTP_LIMIT = int(os.getenv('HTTP_LIMIT', '100'))
+HTTP_LIMIT_PER_HOST = int(os.getenv('HTTP_LIMIT_PER_HOST', '20'))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', '30'))
+HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', '300'))
+HTTP_TOTAL_TIMEOUT = float(os.getenv('HTTP_TOTAL_TIMEOUT', '15'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+
+_session: aiohttp.ClientSession | None = None
+_counters = {'in_flight': 0, 'requests': 0, 'connections_created': 0, 'connections_reused': 0}
+
+
+async def _on_request_start(session, context, params) -> None:
+    _counters['in_flight'] += 1
+    _counters['requests'] += 1
+
+
+async def _on_request_done(session, context, params) -> None:
+    _counters['in_flight'] -= 1
+
+
+async def _on_connection_create_end(session, context, params) -> None:
+    _counters['connections_created'] += 1
+
+
+async def _on_connection_reuseconn(session, context, params) -> None:
+    _counters['connections_reused'] += 1
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(_on_request_start)
+    trace.on_request_end.append(_on_request_done)
+    trace.on_request_exception.append(_on_request_done)
+    trace.on_connection_create_end.append(_on_connection_create_end)
+    trace.on_connection_reuseconn.append(_on_connection_reuseconn)
+    return trace
+
+
+async def start_client() -> aiohttp.ClientSession:
+    """Создает общий пул соединений для всех запросов к внешним API."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_LIMIT,
+            limit_per_host=HTTP_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            use_dns_cache=True,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=HTTP_TOTAL_TIMEOUT,
+            sock_connect=HTTP_CONNECT_TIMEOUT,
+            sock_read=HTTP_READ_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[_trace_config()])
+    return _session
+
+
+async def close_client() -> None:
+    """Закрывает общий пул соединений."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Возвращает общую сессию, создавая ее при первом обращении."""
+    if _session is None or _session.closed:
+        return await start_client()
+    return _session
+
+
+def pool_stats() -> dict[str, int]:
+    """Статистика пула: открытые, простаивающие и активные соединения."""
+    stats = dict(_counters)
+    stats['open'] = 0
+    stats['idle'] = 0
+    stats['acquired'] = 0
+    if _session is None or _session.closed:
+        return stats
+    connector = _session.connector
+    idle = sum(len(conns) for conns in getattr(connector, '_conns', {}).values())
+    acquired = len(getattr(connector, '_acquired', ()))
+    stats['idle'] = idle
+    stats['acquired'] = acquired
+    stats['open'] = idle + acquired
+    stats['limit'] = connector.limit
+    stats['limit_per_host'] = connector.limit_per_host
+    return stats
@@ -0,0 +1,104 @@
+import re
+from html.parser import HTMLParser
+
+VOID_TAGS = frozenset((
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr',
+))
+MOST_WANTED_RE = re.compile(r'<[^<>]*most_wanted')
+
+
+class _Done(Exception):
+    pass
+
+
+class MostWantedParser(HTMLParser):
+    """Потоковый разбор выдачи Кинопоиска до конца блока most_wanted.
+
+    Повторяет логику get_most_wanted_film_id_css (benchmarks/bench_parser.py):
+    первый [data-id] внутри .element.most_wanted и первый span.gray внутри
+    div.info блока div.element.most_wanted. Разбор останавливается, как
+    только оба найдены.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        # (тег, внутри .element.most_wanted, это div "element most_wanted", div.info, span.gray)
+        self.stack: list[tuple[str, bool, bool, bool, bool]] = []
+        self.data_id: str | None = None
+        self.block_state = 'search'  # search -> block -> info -> span -> done
+        self.title_parts: list[str] = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        attributes = {name: value or '' for name, value in attrs}
+        classes = attributes.get('class', '').split()
+        in_wanted = bool(self.stack) and self.stack[-1][1]
+
+        if in_wanted and self.data_id is None and 'data-id' in attributes:
+            self.data_id = attributes['data-id']
+            self._check_done()
+
+        is_block = is_info = is_gray = False
+        if tag == 'div' and self.block_state == 'search' and ' '.join(classes) == 'element most_wanted':
+            is_block = True
+            self.block_state = 'block'
+        elif tag == 'div' and self.block_state == 'block' and 'info' in classes:
+            is_info = True
+            self.block_state = 'info'
+        elif tag == 'span' and self.block_state == 'info' and 'gray' in classes:
+            is_gray = True
+            self.block_state = 'span'
+
+        if tag in VOID_TAGS:
+            return
+        wanted = in_wanted or ('element' in classes and 'most_wanted' in classes)
+        self.stack.append((tag, wanted, is_block, is_info, is_gray))
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                break
+        else:
+            return
+        for _, _, is_block, is_info, is_gray in self.stack[i:]:
+            if is_gray:
+                self.block_state = 'done'
+                self._check_done()
+            elif (is_info or is_block) and self.block_state not in ('span', 'done'):
+                raise _Done
+        del self.stack[i:]
+
+    def handle_data(self, data: str) -> None:
+        if self.block_state == 'span':
+            text = data.strip()
+            if text:
+                self.title_parts.append(text)
+
+    def _check_done(self) -> None:
+        if self.block_state == 'done' and self.data_id is not None:
+            raise _Done
+
+    def result(self) -> tuple[str, str] | None:
+        if self.block_state not in ('span', 'done') or self.data_id is None:
+            return None
+        title = re.sub(r',?\s*\d+\s*мин\s*$', '', ''.join(self.title_parts))
+        return self.data_id, title
+
+
+def find_most_wanted(html: str) -> tuple[str, str] | None:
+    """Быстрый аналог get_most_wanted_film_id_css: разбирает только нужный блок."""
+    match = MOST_WANTED_RE.search(html)
+    if match is None:
+        return None
+    parser = MostWantedParser()
+    try:
+        parser.feed(html[match.start():])
+        parser.close()
+    except _Done:
+        pass
+    return parser.result()
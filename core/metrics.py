@@ -0,0 +1,254 @@
+"""Метрики в текстовом формате Prometheus, без сторонних зависимостей.
+
+Гистограммы и счетчики обновляются в коде напрямую; статистика, которую
+модули уже собирают для /internal/stats, добавляется функциями-сборщиками
+и отдается как gauge в момент запроса /metrics.
+
+Воркеры gunicorn -- отдельные процессы, а /metrics попадает в любой из них.
+Поэтому с METRICS_DIR каждый воркер раз в METRICS_FLUSH_INTERVAL секунд
+сохраняет свои значения в METRICS_DIR/<pid>.json, и /metrics отдает сумму
+счетчиков и гистограмм всех воркеров, включая завершившиеся: сумма не
+убывает при перезапуске воркера. Gauge по смыслу у каждого процесса свой,
+они отдаются с меткой worker и только от воркеров, писавших недавно.
+"""
+import asyncio
+import glob
+import json
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Callable
+
+METRICS_PREFIX = os.getenv('METRICS_PREFIX', 'cinema')
+# пусто -- метрики только этого процесса
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# секунды: от попадания в кэш до дедлайна этапа
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_FIELD = re.compile(r'[a-z_][a-z0-9_]*')
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[Any, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: Any, amount: float = 1) -> None:
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dump(self) -> list:
+        with self._lock:
+            return [[list(labels), value] for labels, value in self.values.items()]
+
+    def merge(self, values: dict[tuple, float], dumped: list) -> None:
+        """Прибавляет к values значения, сохраненные dump в другом процессе."""
+        for labels, value in dumped:
+            labels = tuple(labels)
+            values[labels] = values.get(labels, 0) + value
+
+    def render(self, values: dict[tuple, float] | None = None) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labels, value in sorted((self.values if values is None else values).items()):
+            lines.append(f'{self.name}{_labels(self.labels, labels)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин; значения -- в секундах."""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = (*buckets, math.inf)
+        # счетчики по корзинам, сумма, число наблюдений
+        self.values: dict[tuple, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: Any) -> None:
+        with self._lock:
+            counts, total = self.values.setdefault(labels, ([0] * len(self.buckets), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            total[0] += value
+
+    def dump(self) -> list:
+        with self._lock:
+            return [[list(labels), counts, total[0]] for labels, (counts, total) in self.values.items()]
+
+    def merge(self, values: dict[tuple, tuple[list[int], list[float]]], dumped: list) -> None:
+        """Прибавляет к values корзины, сохраненные dump в другом процессе."""
+        for labels, counts, total in dumped:
+            mine = values.setdefault(tuple(labels), ([0] * len(self.buckets), [0.0]))
+            for i, count in enumerate(counts[:len(self.buckets)]):
+                mine[0][i] += count
+            mine[1][0] += total
+
+    def render(self, values: dict[tuple, tuple[list[int], list[float]]] | None = None) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total) in sorted((self.values if values is None else values).items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, labels)} {_number(total[0])}')
+            lines.append(f'{self.name}_count{_labels(self.labels, labels)} {cumulative}')
+        return lines
+
+
+def _flatten(prefix: str, stats: dict[str, Any], labels: tuple[tuple[str, Any], ...] = ()):
+    """Числовые поля статистики; вложенные словари превращаются в метку name.
+
+    Имя метрики строится только из имен полей вида snake_case, все остальное
+    (например, ключи из данных пользователя) в /metrics не попадает.
+    """
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(prefix, value, (*labels, ('name', key)))
+        elif isinstance(value, (bool, int, float)) and _FIELD.fullmatch(str(key)):
+            yield f'{prefix}_{key}', labels, float(value) if isinstance(value, float) else int(value)
+
+
+class Registry:
+    def __init__(self, prefix: str = METRICS_PREFIX, directory: str = METRICS_DIR) -> None:
+        self.prefix = prefix
+        self.directory = directory
+        self.metrics: dict[str, Counter | Histogram] = {}
+        self.collectors: dict[str, Callable[[], dict[str, Any]]] = {}
+        self.exported: set[str] = set()
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self.metrics.setdefault(name, Counter(f'{self.prefix}_{name}', help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(f'{self.prefix}_{name}', help, labels))
+
+    def collect(self, name: str, stats: Callable[[], dict[str, Any]], export: bool = True) -> None:
+        """Отдавать числовые поля stats() как gauge с префиксом name.
+
+        export=False -- только в /internal/stats, например статистика по ключам запросов.
+        """
+        self.collectors[name] = stats
+        if export:
+            self.exported.add(name)
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Статистика всех сборщиков как есть, для /internal/stats."""
+        return {name: stats() for name, stats in self.collectors.items()}
+
+    def _gauges(self) -> list[tuple[str, tuple[tuple[str, Any], ...], float]]:
+        gauges = []
+        for name, stats in self.collectors.items():
+            if name not in self.exported:
+                continue
+            try:
+                gauges.extend(_flatten(f'{self.prefix}_{name}', stats()))
+            except Exception:
+                continue
+        return gauges
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def write(self) -> None:
+        """Сохраняет значения этого процесса в METRICS_DIR для /metrics остальных воркеров."""
+        data = {'metrics': {name: metric.dump() for name, metric in self.metrics.items()},
+                'gauges': [[metric, [list(label) for label in labels], value]
+                           for metric, labels, value in self._gauges()]}
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getpid())
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(data, file)
+        os.replace(f'{path}.tmp', path)
+
+    async def flush_forever(self) -> None:
+        """Периодическая запись для воркеров gunicorn; без METRICS_DIR ничего не делает."""
+        if not self.directory:
+            return
+        try:
+            while True:
+                await asyncio.to_thread(self.write)
+                await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+        finally:
+            await asyncio.to_thread(self.write)
+
+    def _peers(self) -> list[tuple[str, dict[str, Any], float]]:
+        """(pid, сохраненные значения, время записи) остальных воркеров."""
+        peers = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            pid = os.path.basename(path)[:-len('.json')]
+            if pid == str(os.getpid()):
+                continue
+            try:
+                with open(path) as file:
+                    peers.append((pid, json.load(file), os.path.getmtime(path)))
+            except (OSError, ValueError):
+                continue
+        return peers
+
+    def render(self) -> str:
+        peers = self._peers() if self.directory else []
+        lines = []
+        for name, metric in self.metrics.items():
+            if not peers:
+                lines.extend(metric.render())
+                continue
+            values: dict = {}
+            metric.merge(values, metric.dump())
+            for _, data, _ in peers:
+                metric.merge(values, data['metrics'].get(name, []))
+            lines.extend(metric.render(values))
+        gauges = self._gauges()
+        if self.directory:
+            gauges = [(metric, (*labels, ('worker', os.getpid())), value) for metric, labels, value in gauges]
+            # gauge завершившегося воркера больше ничего не значит
+            fresh = time.time() - 3 * METRICS_FLUSH_INTERVAL
+            for pid, data, written_at in peers:
+                if written_at >= fresh:
+                    gauges.extend((metric, (*map(tuple, labels), ('worker', pid)), value)
+                                  for metric, labels, value in data['gauges'])
+        # строки одной метрики должны идти подряд, а поля вложенных словарей перемешаны
+        families: dict[str, list[str]] = {}
+        for metric, labels, value in gauges:
+            names, label_values = zip(*labels) if labels else ((), ())
+            families.setdefault(metric, []).append(f'{metric}{_labels(names, label_values)} {_number(value)}')
+        for metric, samples in families.items():
+            lines.append(f'# TYPE {metric} gauge')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Registry()
+
+STAGE_SECONDS = METRICS.histogram('stage_seconds', 'Длительность этапов поиска, секунды', ('stage', 'outcome'))
+STAGE_ERRORS = METRICS.counter('stage_errors_total', 'Ошибки этапов поиска по типу', ('stage', 'error'))
+UPSTREAM_SECONDS = METRICS.histogram('upstream_request_seconds', 'Запросы к внешним API, секунды',
+                                     ('upstream', 'status'))
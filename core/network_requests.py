@@ -0,0 +1,188 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable
+from urllib.parse import quote
+import aiohttp
+from core.breaker import BREAKERS
+from core.cache import FILM_CACHE
+from core.film import FilmRecord
+from core.http_client import get_session
+from core.metrics import UPSTREAM_SECONDS
+from core.normalize import query_key
+from core.rate_limit import LIMITS, RETRIES, UpstreamUnavailable, retry_delay
+from core.single_flight import FLIGHTS
+
+API_KEY_IMDB = os.getenv('apikey')
+API_KEY_KINOPOISK = os.getenv('API_KEY_KINOPOISK', '')
+
+# адреса внешних API можно подменить, например на локальную заглушку
+OMDB_URL = os.getenv('OMDB_URL', 'http://www.omdbapi.com')
+KINOPOISK_URL = os.getenv('KINOPOISK_URL', 'https://www.kinopoisk.ru')
+KINOPOISK_API_URL = os.getenv('KINOPOISK_API_URL', 'https://kinopoiskapiunofficial.tech')
+# у API с ключом и квотой 401/402/403 -- неверный ключ или кончилась квота: повтор не поможет,
+# а ответ без данных нельзя выдавать пользователю за «не найдено»
+QUOTA_LIMITED = ('kinopoisk_api', 'omdb')
+QUOTA_STATUSES = (401, 402, 403)
+
+
+class _Retry(Exception):
+    """Попытка не удалась, но запрос можно повторить."""
+
+    def __init__(self, reason: str, delay: float) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.delay = delay
+
+
+async def _attempt(upstream: str, url: str, headers: dict[str, str] | None, as_json: bool | None,
+                   raise_for_status: bool, attempt: int):
+    bucket = LIMITS[upstream]
+    with BREAKERS[upstream].call() as call:
+        await bucket.acquire()
+        session = await get_session()
+        call.started = time.monotonic()
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            async with session.get(url, headers=headers) as response:
+                status = response.status
+                if upstream in QUOTA_LIMITED and response.status in QUOTA_STATUSES:
+                    call.ok = True
+                    raise UpstreamUnavailable(upstream, f'HTTP {response.status}')
+                if response.status != 429 and response.status < 500:
+                    if raise_for_status and response.status >= 400:
+                        call.ok = True
+                        response.raise_for_status()
+                    if as_json is None:
+                        as_json = 'application/json' in response.headers.get('Content-Type', '')
+                    body = await response.json() if as_json else await response.text()
+                    call.ok = True
+                    return body
+                call.ok = False
+                delay = retry_delay(attempt, response.headers.get('Retry-After'))
+                if response.status == 429:
+                    bucket.pause(delay)
+                raise _Retry(f'HTTP {response.status}', delay)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            call.ok = False
+            raise _Retry(repr(e), retry_delay(attempt)) from e
+        except asyncio.CancelledError:
+            status = 'cancelled'
+            raise
+        finally:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream, status)
+
+
+async def _hedged(upstream: str, attempt: Callable[[], Awaitable[Any]]):
+    """Если попытка не ответила за обычное для API время, параллельно отправляет вторую.
+
+    Побеждает первый успешный ответ, вторая попытка отменяется.
+    """
+    breaker = BREAKERS[upstream]
+    breaker.counters['requests'] += 1
+    delay = breaker.hedge_delay()
+    if delay is None:
+        return await attempt()
+    tasks = [asyncio.create_task(attempt())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            breaker.counters['hedges'] += 1
+            tasks.append(asyncio.create_task(attempt()))
+        error = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not tasks[0]:
+                        breaker.counters['hedge_wins'] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def request(upstream: str, url: str, headers: dict[str, str] | None = None,
+                  as_json: bool | None = None, raise_for_status: bool = False):
+    """GET к внешнему API с лимитом запросов, предохранителем, повторами и учетом Retry-After.
+
+    as_json=None -- разбирать JSON по Content-Type, иначе вернуть текст.
+    При разомкнутом предохранителе сразу бросает CircuitOpen, не дожидаясь
+    таймаута, чтобы поиск перешел к следующему источнику.
+    """
+    for attempt in range(RETRIES + 1):
+        try:
+            return await _hedged(upstream, lambda: _attempt(upstream, url, headers, as_json, raise_for_status,
+                                                            attempt))
+        except _Retry as e:
+            reason, delay = e.reason, e.delay
+        if attempt == RETRIES:
+            raise UpstreamUnavailable(upstream, reason)
+        await asyncio.sleep(delay)
+
+
+async def get(url: str, upstream: str = 'omdb'):
+    return await request(upstream, url, as_json=True, raise_for_status=True)
+
+
+async def _search_imdb_id(query: str) -> str | None:
+    response = await get(f'{OMDB_URL}/?apikey={API_KEY_IMDB}&s={quote(query, safe="")}')
+    if not response.get('Search'):
+        return None
+    return response['Search'][0]['imdbID']
+
+
+async def _fetch_imdb_film_info(imdb_id: str) -> FilmRecord | None:
+    info = await get(f'{OMDB_URL}/?apikey={API_KEY_IMDB}&i={imdb_id}')
+    if not isinstance(info, dict) or info.get('Response') != 'True':
+        return None
+    return FilmRecord.from_omdb(info)
+
+
+async def get_imdb_film_info(imdb_id: str) -> FilmRecord | None:
+    key = f'omdb_film:{imdb_id}'
+    return await FLIGHTS.do(key, lambda: FILM_CACHE.get_or_fetch(key, lambda: _fetch_imdb_film_info(imdb_id)))
+
+
+async def search_imdb(query: str) -> FilmRecord | None:
+    normalized = query_key(query)
+    if normalized:
+        key = f'imdb_search:{normalized}'
+        imdb_id = await FLIGHTS.do(key, lambda: FILM_CACHE.get_or_fetch(key, lambda: _search_imdb_id(query)))
+    else:
+        imdb_id = await _search_imdb_id(query)
+    if imdb_id is None:
+        return None
+    return await get_imdb_film_info(imdb_id)
+
+
+async def search_kinopoisk(query: str):
+    url = f'{KINOPOISK_URL}/index.php?kp_query={quote(query, safe="")}'
+    return await request('kinopoisk', url, as_json=False)
+
+
+async def _fetch_kinopoisk_film_info(data_id: str) -> FilmRecord | None:
+    url = f'{KINOPOISK_API_URL}/api/v2.2/films/{data_id}'
+    info = await request('kinopoisk_api', url, headers={'X-API-KEY': API_KEY_KINOPOISK}, as_json=True)
+    if not isinstance(info, dict) or 'kinopoiskId' not in info:
+        return None
+    return FilmRecord.from_kinopoisk(info)
+
+
+async def get_kinopoisk_film_info(data_id: str) -> FilmRecord | None:
+    key = f'kp_film:{data_id}'
+    return await FLIGHTS.do(key, lambda: FILM_CACHE.get_or_fetch(key, lambda: _fetch_kinopoisk_film_info(data_id)))
+
+
+async def fallback_kinopoisk_get(query: str) -> tuple[str | None, str | None]:
+    url = f'{KINOPOISK_API_URL}/api/v2.1/films/search-by-keyword?keyword={quote(query, safe="")}'
+    result = await request('kinopoisk_api', url, headers={'X-API-KEY': API_KEY_KINOPOISK}, as_json=True)
+    result = result.get('films')
+    if not result:
+        return None, None
+    return result[0].get("filmId"), result[0].get("nameEn") or result[0].get("nameRu")
@@ -0,0 +1,43 @@
+"""Нормализация поисковых запросов: разные написания одного запроса -- один ключ.
+
+fold приводит текст к виду для сравнения названий (Unicode NFKC, регистр,
+ё/е, пунктуация, пробелы). query_key дополнительно отделяет год, поэтому
+«Матрица (1999)» и «матрица 1999 г.» дают один ключ кэша. Письменность и
+диакритика не меняются: транслитерация склеивает разные запросы («Он» и
+«On», «Мой» и «Мои»), а латиница у названий не однозначна («Viy», «Vii»).
+Пустой ключ (запрос из одних знаков или эмодзи) ничего не склеивает.
+"""
+import re
+import time
+import unicodedata
+
+_NON_WORD = re.compile(r'[\W_]+')
+_YEAR_SUFFIX = re.compile(r'^(?P<title>.*\D) (?P<year>(?:18|19|20)\d\d)(?: (?:г|год|года|year))?$')
+_YEAR_PREFIX = re.compile(r'^(?P<year>(?:18|19|20)\d\d) (?:г |год |года )?(?P<title>\D.*)$')
+
+
+def fold(text: str) -> str:
+    """Регистр, ё/е, совместимые символы Unicode, пунктуация и лишние пробелы."""
+    text = unicodedata.normalize('NFKC', text).casefold().replace('ё', 'е')
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+
+def split_year(folded: str) -> tuple[str, int | None]:
+    """Отделяет год выпуска в начале или конце запроса: ('матрица', 1999).
+
+    Годом считается число от 1888 до следующих пяти лет; запрос из одного
+    числа («1917») остается названием.
+    """
+    match = _YEAR_SUFFIX.match(folded) or _YEAR_PREFIX.match(folded)
+    if match is None:
+        return folded, None
+    year = int(match['year'])
+    if not 1888 <= year <= time.gmtime().tm_year + 5:
+        return folded, None
+    return match['title'].strip(), year
+
+
+def query_key(query: str) -> str:
+    """Канонический ключ запроса для кэша и выученных соответствий; '' -- склеивать не с чем."""
+    title, year = split_year(fold(query))
+    return f'{title} {year}' if year is not None else title
@@ -0,0 +1,93 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, NamedTuple
+
+from core.tracing import span
+
+STAGE_TIMEOUT = float(os.getenv('PIPELINE_STAGE_TIMEOUT', '8'))
+OMDB_STAGE_TIMEOUT = float(os.getenv('PIPELINE_OMDB_TIMEOUT', '5'))
+FALLBACK_DELAY = float(os.getenv('PIPELINE_FALLBACK_DELAY', '1.5'))
+
+
+class StageTimeout(Exception):
+    pass
+
+
+class Stage(NamedTuple):
+    """Этап поиска: фабрика корутины, дедлайн и задержка старта в гонке."""
+    name: str
+    fetch: Callable[[], Awaitable[Any]]
+    deadline: float = STAGE_TIMEOUT
+    delay: float = 0.0
+    required: bool = True
+
+
+def _not_none(value: Any) -> bool:
+    return value is not None
+
+
+async def run_stage(stage: Stage) -> Any:
+    """Выполняет этап с дедлайном; необязательный этап при ошибке возвращает None."""
+    try:
+        with span(stage.name):
+            return await asyncio.wait_for(stage.fetch(), stage.deadline)
+    except asyncio.TimeoutError as e:
+        if stage.required:
+            raise StageTimeout(f'{stage.name}: нет ответа за {stage.deadline:g} с') from e
+    except Exception:
+        if stage.required:
+            raise
+    return None
+
+
+async def _cancel(tasks: set[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def race(stages: list[Stage], accept: Callable[[Any], bool] = _not_none) -> Any:
+    """Возвращает первый подходящий результат из нескольких источников.
+
+    Этап стартует после своей задержки или сразу, если все запущенные
+    ранее завершились без результата. Проигравшие этапы отменяются.
+    """
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    queue = list(stages)
+    running: set[asyncio.Task] = set()
+    errors: list[BaseException] = []
+    try:
+        while queue or running:
+            if queue and (not running or loop.time() - started_at >= queue[0].delay):
+                running.add(asyncio.create_task(run_stage(queue.pop(0))))
+                continue
+            timeout = max(0.0, started_at + queue[0].delay - loop.time()) if queue else None
+            done, running = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    errors.append(task.exception())
+                elif accept(task.result()):
+                    return task.result()
+    finally:
+        await _cancel(running)
+    if errors:
+        raise errors[0]
+    return None
+
+
+async def run_parallel(*stages: Stage) -> list[Any]:
+    """Выполняет независимые этапы одновременно.
+
+    Ошибка обязательного этапа отменяет остальные и пробрасывается дальше.
+    """
+    tasks = [asyncio.create_task(run_stage(stage)) for stage in stages]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+        return [task.result() for task in tasks]
+    finally:
+        await _cancel({task for task in tasks if not task.done()})
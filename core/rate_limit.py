@@ -0,0 +1,211 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY: ContextVar[int] = ContextVar('PRIORITY', default=INTERACTIVE)
+
+RETRIES = int(os.getenv('UPSTREAM_RETRIES', '2'))
+RETRY_BASE_DELAY = float(os.getenv('UPSTREAM_RETRY_BASE_DELAY', '0.5'))
+RETRY_MAX_DELAY = float(os.getenv('UPSTREAM_RETRY_MAX_DELAY', '10'))
+# сколько процессов делят лимиты внешних API; для веб-сервиса задается в gunicorn.conf.py
+PROCESSES = max(1, int(os.getenv('WEB_CONCURRENCY', '1')))
+
+
+class UpstreamUnavailable(Exception):
+    def __init__(self, upstream: str, reason: str = '') -> None:
+        super().__init__(f'Сервис {upstream} временно недоступен, попробуйте позже')
+        self.upstream = upstream
+        self.reason = reason
+
+
+class QuotaExhausted(UpstreamUnavailable):
+    def __init__(self, upstream: str) -> None:
+        super().__init__(upstream, 'daily quota exhausted')
+
+
+class BudgetExhausted(UpstreamUnavailable):
+    def __init__(self, upstream: str) -> None:
+        super().__init__(upstream, 'budget exhausted')
+
+
+class Budget:
+    """Сколько запросов к каждому API может сделать фоновая задача.
+
+    Действует на запросы, сделанные в контексте, где установлен BUDGET;
+    API без лимита в limits не ограничиваются.
+    """
+
+    def __init__(self, limits: dict[str, int]) -> None:
+        self.limits = limits
+        self.spent = dict.fromkeys(limits, 0)
+
+    def spend(self, upstream: str) -> None:
+        if upstream not in self.limits:
+            return
+        if self.spent[upstream] >= self.limits[upstream]:
+            raise BudgetExhausted(upstream)
+        self.spent[upstream] += 1
+
+
+BUDGET: ContextVar[Budget | None] = ContextVar('BUDGET', default=None)
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
+class TokenBucket:
+    """Ограничитель запросов к одному внешнему API.
+
+    rate токенов в секунду, не больше burst в запасе и не больше daily_quota
+    запросов за сутки (0 -- без ограничения). Ожидающие запросы обслуживаются
+    по приоритету: интерактивные раньше фоновых.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, daily_quota: int = 0) -> None:
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.daily_quota = daily_quota
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.day = _today()
+        self.used_today = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._drainer: asyncio.Task | None = None
+        self.counters = {'acquired': 0, 'waited': 0, 'rejected': 0, 'throttled': 0, 'wait_seconds': 0.0}
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _check_quota(self) -> None:
+        if self.day != _today():
+            self.day = _today()
+            self.used_today = 0
+        if self.daily_quota and self.used_today >= self.daily_quota:
+            self.counters['rejected'] += 1
+            raise QuotaExhausted(self.name)
+
+    def _take(self) -> None:
+        self.tokens -= 1
+        self.used_today += 1
+        self.counters['acquired'] += 1
+
+    def _ready(self) -> bool:
+        self._refill()
+        return self.tokens >= 1 and time.monotonic() >= self.paused_until
+
+    async def acquire(self, priority: int | None = None) -> None:
+        self._check_quota()
+        budget = BUDGET.get()
+        if budget is not None:
+            budget.spend(self.name)
+        if not self._waiters and self._ready():
+            self._take()
+            return
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (PRIORITY.get() if priority is None else priority, next(self._order), future))
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.create_task(self._drain())
+        self.counters['waited'] += 1
+        await future
+        self.counters['wait_seconds'] += time.monotonic() - started
+
+    async def _drain(self) -> None:
+        while self._waiters:
+            if not self._ready():
+                delay = max(self.paused_until - time.monotonic(), (1 - self.tokens) / self.rate)
+                await asyncio.sleep(max(delay, 0.001))
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            try:
+                self._check_quota()
+            except UpstreamUnavailable as e:
+                future.set_exception(e)
+                continue
+            self._take()
+            future.set_result(None)
+
+    def quota_left(self) -> int | None:
+        """Сколько запросов осталось до конца суток; None -- без суточного лимита."""
+        if not self.daily_quota:
+            return None
+        if self.day != _today():
+            return self.daily_quota
+        return max(0, self.daily_quota - self.used_today)
+
+    def pause(self, seconds: float) -> None:
+        """Останавливает выдачу токенов, например по Retry-After."""
+        self.counters['throttled'] += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict[str, Any]:
+        self._refill()
+        return {
+            **self.counters,
+            'rate': self.rate,
+            'tokens': round(self.tokens, 2),
+            'queued': len(self._waiters),
+            'used_today': self.used_today,
+            'daily_quota': self.daily_quota,
+            'quota_used': self.used_today / self.daily_quota if self.daily_quota else 0.0,
+        }
+
+
+def _bucket(name: str, env: str, rate: str, burst: str, daily: str) -> TokenBucket:
+    """Лимиты из окружения делятся поровну между PROCESSES процессами."""
+    daily_quota = int(os.getenv(f'{env}_DAILY_QUOTA', daily))
+    return TokenBucket(
+        name,
+        rate=float(os.getenv(f'{env}_RPS', rate)) / PROCESSES,
+        burst=max(1, int(os.getenv(f'{env}_BURST', burst)) // PROCESSES),
+        daily_quota=max(1, daily_quota // PROCESSES) if daily_quota else 0,
+    )
+
+
+LIMITS = {
+    'kinopoisk': _bucket('kinopoisk', 'KINOPOISK', '5', '10', '0'),
+    'kinopoisk_api': _bucket('kinopoisk_api', 'KINOPOISK_API', '20', '20', '500'),
+    'omdb': _bucket('omdb', 'OMDB', '10', '10', '1000'),
+}
+
+
+def retry_delay(attempt: int, retry_after: str | None = None) -> float:
+    """Задержка перед повтором: Retry-After, если он есть, иначе экспонента со случайным разбросом.
+
+    Retry-After бывает числом секунд или HTTP-датой (RFC 9110).
+    """
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+        try:
+            when = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            pass
+        else:
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=timezone.utc)
+            return min(max((when - datetime.now(timezone.utc)).total_seconds(), 0.0), RETRY_MAX_DELAY)
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def rate_limit_stats() -> dict[str, dict[str, Any]]:
+    return {name: bucket.stats() for name, bucket in LIMITS.items()}
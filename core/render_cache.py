@@ -0,0 +1,72 @@
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from core.film import FilmRecord
+from core.tracing import span
+from core.workers import CPU_POOL
+
+RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', '4096'))
+
+
+def film_key(film: FilmRecord) -> Hashable:
+    return film.imdb_id or film.kinopoisk_id or (film.title, film.year)
+
+
+class RenderCache:
+    """Готовые карточки фильмов по ключу (фильм, вид вывода).
+
+    Вместе с результатом хранится запись фильма, по которой он построен:
+    если запись в кэше фильмов обновилась, карточка строится заново.
+    """
+
+    def __init__(self, max_size: int = RENDER_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self.entries: OrderedDict[Hashable, tuple[FilmRecord, str]] = OrderedDict()
+        self.counters = {'hits': 0, 'misses': 0, 'invalidated': 0, 'evictions': 0}
+
+    def get(self, flavor: str, film: FilmRecord, *args: Hashable) -> str | None:
+        key = (film_key(film), flavor, *args)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.counters['misses'] += 1
+            return None
+        source, output = entry
+        if source is not film and source != film:
+            del self.entries[key]
+            self.counters['invalidated'] += 1
+            self.counters['misses'] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.counters['hits'] += 1
+        return output
+
+    def put(self, flavor: str, film: FilmRecord, output: str, *args: Hashable) -> str:
+        key = (film_key(film), flavor, *args)
+        self.entries[key] = (film, output)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.counters['evictions'] += 1
+        return output
+
+    def render(self, flavor: str, film: FilmRecord, render: Callable[..., str], *args: Hashable) -> str:
+        output = self.get(flavor, film, *args)
+        if output is None:
+            with span(f'render_{flavor}'):
+                output = self.put(flavor, film, render(film, *args), *args)
+        return output
+
+    async def render_in_pool(self, flavor: str, film: FilmRecord, render: Callable[[FilmRecord], str]) -> str:
+        """Как render, но промах отправляется в CPU_POOL."""
+        output = self.get(flavor, film)
+        if output is None:
+            with span(f'render_{flavor}'):
+                output = self.put(flavor, film, await CPU_POOL.run(render, film))
+        return output
+
+    def stats(self) -> dict[str, Any]:
+        return {**self.counters, 'size': len(self.entries), 'max_size': self.max_size}
+
+
+RENDER_CACHE = RenderCache()
@@ -0,0 +1,101 @@
+import asyncio
+from typing import AsyncIterator
+from core.aliases import ALIASES
+from core.cache import FILM_CACHE
+from core.catalog import CATALOG
+from core.film import FilmRecord
+from core.kp_parser import find_most_wanted
+from core.normalize import query_key
+from core.single_flight import FLIGHTS
+from core.tracing import span
+from core.workers import CPU_POOL
+from core.network_requests import fallback_kinopoisk_get, get_kinopoisk_film_info, search_imdb, search_kinopoisk
+from core.pipeline import FALLBACK_DELAY, OMDB_STAGE_TIMEOUT, Stage, race, run_parallel, run_stage
+
+
+async def _scrape_most_wanted(query: str) -> tuple[str, str] | None:
+    html = await search_kinopoisk(query)
+    with span('kinopoisk_parse'):
+        return await CPU_POOL.run(find_most_wanted, html)
+
+
+async def _keyword_search(query: str) -> tuple[str, str] | None:
+    film_info = await fallback_kinopoisk_get(query)
+    return film_info if film_info[0] is not None else None
+
+
+async def resolve_film(query: str) -> tuple[str, str] | None:
+    """Находит id фильма на Кинопоиске: парсинг выдачи наперегонки с поиском по ключевым словам.
+
+    Написания, по которым фильм уже находили, разрешаются без сети (core.aliases).
+    Запрос с пустым ключом (одни знаки или эмодзи) ищется как есть, без кэша.
+    """
+    normalized = query_key(query)
+    if not normalized:
+        return await _resolve_film(query)
+    alias = ALIASES.lookup(normalized)
+    if alias is not None:
+        return alias
+    key = f'resolve:{normalized}'
+    with span('resolve'):
+        result = await FLIGHTS.do(key, lambda: FILM_CACHE.get_or_fetch(key, lambda: _resolve_film(query)))
+    return tuple(result) if result is not None else None
+
+
+async def _resolve_film(query: str) -> tuple[str, str] | None:
+    # нечеткий поиск по каталогу -- десятки миллисекунд CPU на промахе, не в цикле событий
+    local = await asyncio.to_thread(CATALOG.lookup, query)
+    if local is not None:
+        return local
+    return await race([
+        Stage('kinopoisk_html', lambda: _scrape_most_wanted(query)),
+        Stage('kinopoisk_keyword', lambda: _keyword_search(query), delay=FALLBACK_DELAY),
+    ])
+
+
+async def search_film(query: str) -> tuple[str | None, str | None, FilmRecord | None]:
+    """Полный поиск: детали с Кинопоиска и данные OMDb запрашиваются параллельно."""
+    film_info = await resolve_film(query)
+    if film_info is None:
+        return None, None, None
+    film_id, original_title = film_info
+    stages = [Stage('kinopoisk_details', lambda: get_kinopoisk_film_info(film_id))]
+    if original_title:
+        stages.append(Stage('omdb', lambda: search_imdb(original_title), OMDB_STAGE_TIMEOUT, required=False))
+    kinopoisk_info, *imdb_info = await run_parallel(*stages)
+    if kinopoisk_info is None:
+        return None, None, None
+    imdb_info = imdb_info[0] if imdb_info else None
+    await CATALOG.remember(kinopoisk_info, [imdb_info.title] if imdb_info else [])
+    await ALIASES.learn(query_key(query), film_id, original_title)
+    return f'https://flcksbr.top/film/{film_id}', original_title, imdb_info or kinopoisk_info
+
+
+async def search_film_progressive(query: str) -> AsyncIterator[tuple[str, str, str, FilmRecord]]:
+    """Поиск по частям: сначала карточка с Кинопоиска, затем, если ответил OMDb, обогащенная.
+
+    Отдает кортежи (этап, ссылка, оригинальное название, данные фильма);
+    если фильм не найден, не отдает ничего.
+    """
+    film_info = await resolve_film(query)
+    if film_info is None:
+        return
+    film_id, original_title = film_info
+    watch_url = f'https://flcksbr.top/film/{film_id}'
+    omdb = None
+    if original_title:
+        omdb = asyncio.create_task(run_stage(
+            Stage('omdb', lambda: search_imdb(original_title), OMDB_STAGE_TIMEOUT, required=False)))
+    try:
+        kinopoisk_info = await run_stage(Stage('kinopoisk_details', lambda: get_kinopoisk_film_info(film_id)))
+        if kinopoisk_info is None:
+            return
+        yield 'kinopoisk', watch_url, original_title, kinopoisk_info
+        imdb_info = await omdb if omdb is not None else None
+        await CATALOG.remember(kinopoisk_info, [imdb_info.title] if imdb_info else [])
+        await ALIASES.learn(query_key(query), film_id, original_title)
+        if imdb_info:
+            yield 'omdb', watch_url, original_title, imdb_info
+    finally:
+        if omdb is not None and not omdb.done():
+            omdb.cancel()
@@ -0,0 +1,62 @@
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable
+
+from core.rate_limit import BACKGROUND, PRIORITY
+
+SAVED_KEYS_LIMIT = 1000
+
+
+class SingleFlight:
+    """Объединяет одновременные одинаковые запросы в один вызов.
+
+    Первый вызов с ключом запускает загрузку, остальные ждут ее результата.
+    Фоновые вызовы объединяются только между собой: загрузка идет в контексте
+    первого вызова, а у фоновых задач свой приоритет и бюджет запросов.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[str, asyncio.Task] = {}
+        self._waiters: dict[str, int] = {}
+        self.saved_by_key: Counter[str] = Counter()
+        self.counters = {'calls': 0, 'coalesced': 0}
+
+    async def do(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        if PRIORITY.get() == BACKGROUND:
+            key = f'background:{key}'
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._calls[key] = task
+            self._waiters[key] = 1
+            self.counters['calls'] += 1
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self._waiters[key] += 1
+            self.counters['coalesced'] += 1
+            self.saved_by_key[key] += 1
+            if len(self.saved_by_key) > 2 * SAVED_KEYS_LIMIT:
+                self.saved_by_key = Counter(dict(self.saved_by_key.most_common(SAVED_KEYS_LIMIT)))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._waiters[key]
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **self.counters,
+            'in_flight': len(self._calls),
+            'waiters': sum(self._waiters.values()),
+            'saved_keys': len(self.saved_by_key),
+        }
+
+    def key_stats(self) -> dict[str, Any]:
+        """Ожидающие и сэкономленные вызовы по ключам: в ключах текст запросов, только для /internal/stats."""
+        return {'waiters': dict(self._waiters), 'top_saved': dict(self.saved_by_key.most_common(20))}
+
+
+FLIGHTS = SingleFlight()
@@ -0,0 +1,73 @@
+"""Замеры этапов обработки запроса и id запроса в логах.
+
+span('kinopoisk_details') измеряет блок кода и пишет длительность в
+гистограмму stage_seconds. Если включен TRACE_LOG, каждый этап еще и
+логируется с id запроса, чтобы по логам можно было собрать, куда ушло
+время конкретного медленного поиска.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from core.metrics import STAGE_ERRORS, STAGE_SECONDS
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+TRACE_LOG = os.getenv('TRACE_LOG', '0') == '1'
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s'
+
+TRACE_ID: ContextVar[str] = ContextVar('trace_id', default='-')
+
+logger = logging.getLogger('cinema.trace')
+
+
+def new_trace(trace_id: str | None = None) -> str:
+    """Назначает id текущему запросу; задача, созданная позже, наследует его."""
+    trace_id = trace_id or uuid.uuid4().hex[:16]
+    TRACE_ID.set(trace_id)
+    return trace_id
+
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = TRACE_ID.get()
+        return True
+
+
+def setup_logging() -> None:
+    """Формат логов сервиса с id запроса в каждой строке."""
+    handler = logging.StreamHandler()
+    handler.addFilter(TraceIdFilter())
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Замер этапа: исход ok, error, timeout или cancelled (этап проиграл гонку или отменен)."""
+    outcome = 'ok'
+    started = time.perf_counter()
+    try:
+        yield
+    except asyncio.CancelledError:
+        outcome = 'cancelled'
+        raise
+    except (asyncio.TimeoutError, TimeoutError):
+        outcome = 'timeout'
+        STAGE_ERRORS.inc(stage, 'TimeoutError')
+        raise
+    except Exception as e:
+        outcome = 'error'
+        STAGE_ERRORS.inc(stage, type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage, outcome)
+        if TRACE_LOG:
+            logger.info('%s %s %.1f ms', stage, outcome, elapsed * 1000)
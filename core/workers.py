@@ -0,0 +1,104 @@
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+CPU_EXECUTOR = os.getenv('CPU_EXECUTOR', 'inline')
+CPU_WORKERS = int(os.getenv('CPU_WORKERS', str(os.cpu_count() or 1)))
+CPU_QUEUE_SIZE = int(os.getenv('CPU_QUEUE_SIZE', '64'))
+CPU_QUEUE_TIMEOUT = float(os.getenv('CPU_QUEUE_TIMEOUT', '2'))
+
+
+class WorkerPoolBusy(Exception):
+    def __init__(self) -> None:
+        super().__init__('Сервис перегружен, попробуйте еще раз через несколько секунд')
+
+
+def _timed_call(func: Callable[..., Any], *args: Any) -> tuple[float, float, Any]:
+    started = time.monotonic()
+    result = func(*args)
+    return started, time.monotonic() - started, result
+
+
+class CpuPool:
+    """Выполняет CPU-задачи (разбор HTML, сборку карточек) вне цикла событий.
+
+    Режимы: inline -- прямо в цикле, thread -- пул потоков, process -- пул процессов.
+    Одновременно в работе и в очереди не больше workers + queue_size задач;
+    остальные ждут до queue_timeout секунд и получают WorkerPoolBusy.
+    """
+
+    def __init__(self, mode: str = CPU_EXECUTOR, workers: int = CPU_WORKERS,
+                 queue_size: int = CPU_QUEUE_SIZE, queue_timeout: float = CPU_QUEUE_TIMEOUT) -> None:
+        if mode not in ('inline', 'thread', 'process'):
+            raise ValueError(f'Неизвестный режим CPU_EXECUTOR: {mode}')
+        self.mode = mode
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.executor: Executor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self.pending = 0
+        self.counters = {
+            'tasks': 0, 'rejected': 0, 'errors': 0,
+            'queue_wait_seconds': 0.0, 'exec_seconds': 0.0,
+            'max_queue_wait_seconds': 0.0, 'max_exec_seconds': 0.0,
+        }
+
+    def _get_executor(self) -> Executor:
+        if self.executor is None:
+            if self.mode == 'process':
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='cpu')
+        return self.executor
+
+    def _record(self, queue_wait: float, exec_time: float) -> None:
+        self.counters['tasks'] += 1
+        self.counters['queue_wait_seconds'] += queue_wait
+        self.counters['exec_seconds'] += exec_time
+        self.counters['max_queue_wait_seconds'] = max(self.counters['max_queue_wait_seconds'], queue_wait)
+        self.counters['max_exec_seconds'] = max(self.counters['max_exec_seconds'], exec_time)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self.mode == 'inline':
+            _, exec_time, result = _timed_call(func, *args)
+            self._record(0.0, exec_time)
+            return result
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers + self.queue_size)
+        submitted = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.counters['rejected'] += 1
+            raise WorkerPoolBusy() from None
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            started, exec_time, result = await loop.run_in_executor(self._get_executor(), _timed_call, func, *args)
+        except Exception:
+            self.counters['errors'] += 1
+            raise
+        finally:
+            self.pending -= 1
+            self._slots.release()
+        self._record(max(0.0, started - submitted), exec_time)
+        return result
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def stats(self) -> dict[str, Any]:
+        stats: dict[str, Any] = {'mode': self.mode, 'workers': self.workers, 'pending': self.pending, **self.counters}
+        tasks = self.counters['tasks']
+        stats['avg_queue_wait_seconds'] = self.counters['queue_wait_seconds'] / tasks if tasks else 0.0
+        stats['avg_exec_seconds'] = self.counters['exec_seconds'] / tasks if tasks else 0.0
+        return stats
+
+
+CPU_POOL = CpuPool()
@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from core.rate_limit import RETRY_MAX_DELAY, retry_delay
+
+
+def test_retry_after_seconds():
+    assert retry_delay(0, '3') == 3.0
+    assert retry_delay(0, '100000') == RETRY_MAX_DELAY
+
+
+def test_retry_after_http_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=5)
+    assert 3.5 <= retry_delay(0, format_datetime(when, usegmt=True)) <= 5.0
+
+
+def test_retry_after_http_date_clamped():
+    future = datetime.now(timezone.utc) + timedelta(hours=1)
+    past = datetime.now(timezone.utc) - timedelta(hours=1)
+    assert retry_delay(0, format_datetime(future, usegmt=True)) == RETRY_MAX_DELAY
+    assert retry_delay(0, format_datetime(past, usegmt=True)) == 0.0
+
+
+def test_retry_after_invalid_falls_back_to_backoff():
+    assert 0.0 <= retry_delay(1, 'soon') <= RETRY_MAX_DELAY
@@ -0,0 +1,123 @@
+import asyncio
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from telebot.types import Update
+
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', '16'))
+BOT_QUEUE_SIZE = int(os.getenv('BOT_QUEUE_SIZE', '256'))
+
+CHAT_FIELDS = ('message', 'edited_message', 'channel_post', 'edited_channel_post', 'business_message')
+
+
+def chat_id(update: Update) -> Any:
+    """Чат, к которому относится обновление; без чата -- само обновление."""
+    for field in CHAT_FIELDS:
+        message = getattr(update, field, None)
+        if message is not None:
+            return message.chat.id
+    callback = getattr(update, 'callback_query', None)
+    if callback is not None and callback.message is not None:
+        return callback.message.chat.id
+    return ('update', update.update_id)
+
+
+class UpdateDispatcher:
+    """Обрабатывает обновления Telegram в workers корутинах.
+
+    Обновления одного чата выполняются строго по очереди, разные чаты --
+    параллельно. Чат с очередью снова встает в конец общей очереди после
+    каждого обновления, чтобы один активный чат не занимал обработчик. Если
+    в очередях уже queue_size обновлений, новое отбрасывается и передается
+    в on_shed.
+    """
+
+    def __init__(self, handle: Callable[[Update], Awaitable[None]], workers: int = BOT_WORKERS,
+                 queue_size: int = BOT_QUEUE_SIZE,
+                 on_shed: Callable[[Update], Awaitable[None]] | None = None) -> None:
+        self.handle = handle
+        self.workers = workers
+        self.queue_size = queue_size
+        self.on_shed = on_shed
+        self.queued = 0
+        self.busy = 0
+        self._chats: dict[Any, deque[Update]] = {}
+        self._ready: asyncio.Queue[Any] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._background: set[asyncio.Task] = set()
+        self._room = asyncio.Event()
+        self._room.set()
+        self.counters = {'accepted': 0, 'processed': 0, 'errors': 0, 'shed': 0, 'max_queued': 0}
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    @property
+    def free(self) -> int:
+        return max(0, self.queue_size - self.queued)
+
+    async def wait_for_room(self) -> None:
+        await self._room.wait()
+
+    def submit(self, update: Update) -> bool:
+        """Ставит обновление в очередь его чата; False -- очередь полна, обновление отброшено."""
+        if self.queued >= self.queue_size:
+            self.counters['shed'] += 1
+            if self.on_shed is not None:
+                task = asyncio.create_task(self.on_shed(update))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+            return False
+        key = chat_id(update)
+        chat = self._chats.get(key)
+        if chat is None:
+            self._chats[key] = deque([update])
+            self._ready.put_nowait(key)
+        else:
+            chat.append(update)
+        self.queued += 1
+        if self.queued >= self.queue_size:
+            self._room.clear()
+        self.counters['accepted'] += 1
+        self.counters['max_queued'] = max(self.counters['max_queued'], self.queued)
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self._ready.get()
+            chat = self._chats[key]
+            update = chat.popleft()
+            self.busy += 1
+            try:
+                await self.handle(update)
+                self.counters['processed'] += 1
+            except Exception:
+                self.counters['errors'] += 1
+            finally:
+                self.busy -= 1
+                self.queued -= 1
+                self._room.set()
+                if chat:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._chats[key]
+
+    async def join(self) -> None:
+        """Ждет, пока очереди опустеют."""
+        while self.queued:
+            await asyncio.sleep(0.05)
+
+    async def stop(self, timeout: float = 10) -> None:
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict[str, Any]:
+        return {**self.counters, 'workers': self.workers, 'busy': self.busy, 'queued': self.queued,
+                'queue_size': self.queue_size, 'chats': len(self._chats)}
@@ -1,70 +1,299 @@
+import asyncio
 import os
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
+from core.tracing import span
+
+HISTORY_FLUSH_SIZE = int(os.getenv('HISTORY_FLUSH_SIZE', '50'))
+HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', '1'))
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA mmap_size=134217728',
+    'PRAGMA busy_timeout=5000',
+)
+
+
+MIGRATIONS = (
+    # 1: индекс для /history и счетчики по (пользователь, фильм) для /stats
+    (
+        'CREATE INDEX IF NOT EXISTS stats_user_id ON stats (user_name, id)',
+        'CREATE TABLE IF NOT EXISTS user_title_stats (user_name TEXT NOT NULL, original_title TEXT NOT NULL,'
+        ' count INTEGER NOT NULL, PRIMARY KEY (user_name, original_title)) WITHOUT ROWID',
+        'CREATE INDEX IF NOT EXISTS user_title_stats_top ON user_title_stats (user_name, count DESC)',
+        "INSERT OR REPLACE INTO user_title_stats (user_name, original_title, count)"
+        " SELECT user_name, COALESCE(original_title, ''), count(*) FROM stats"
+        " WHERE user_name IS NOT NULL GROUP BY user_name, COALESCE(original_title, '')",
+        "CREATE TRIGGER IF NOT EXISTS stats_count_insert AFTER INSERT ON stats WHEN NEW.user_name IS NOT NULL"
+        " BEGIN INSERT INTO user_title_stats (user_name, original_title, count)"
+        " VALUES (NEW.user_name, COALESCE(NEW.original_title, ''), 1)"
+        " ON CONFLICT (user_name, original_title) DO UPDATE SET count = count + 1; END",
+    ),
+    # 2: file_id постеров, уже загруженных в Telegram
+    (
+        'CREATE TABLE IF NOT EXISTS poster_files (film_key TEXT PRIMARY KEY, poster_url TEXT NOT NULL,'
+        ' file_id TEXT NOT NULL, updated_at REAL NOT NULL) WITHOUT ROWID',
+    ),
+)
+
 
 class MovieData:
-    def __init__(self) -> None:
+    def __init__(self, db_path: str = '/app/data/MovieData.db') -> None:
         # self.db_name = 'MovieData'
-        self.db_path = '/app/data/MovieData.db'
+        self.db_path = db_path
         self.stats_table = 'stats'
+        self.counts_table = 'user_title_stats'
+        self.posters_table = 'poster_files'
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.RLock()
         self.init_stats_table()
+        self.migrate()
 
     def get_connection(self) -> sqlite3.Connection:
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Возвращает единственное долгоживущее соединение с базой."""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._conn = conn
+        return self._conn
 
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
 
     def table_exists(self, table_name: str) -> bool:
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT count(*) FROM sqlite_master WHERE type='table' AND name=?;", (table_name,))
+        with self._lock:
+            cursor = self.get_connection().execute(
+                "SELECT count(*) FROM sqlite_master WHERE type='table' AND name=?;", (table_name,))
             return cursor.fetchone()[0] > 0
 
-
     def create_table(self, table_name: str, columns: list[str]) -> None:
-        with self.get_connection() as conn:
+        with self._lock, self.get_connection() as conn:
             conn.execute(f"CREATE TABLE  IF NOT EXISTS {table_name} ({', '.join(columns)})")
-            conn.commit()
-
-
-    def insert(self, table_name: str, headers: list[str], values: list[list[Any]]) -> None:
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                f'INSERT INTO {table_name} ({', '.join(headers)}) VALUES ({
-                    ', '.join(['?' for _ in values])
-                    })', values)
-            conn.commit()
 
+    def insert(self, table_name: str, headers: list[str], values: list[Any]) -> None:
+        placeholders = ', '.join('?' for _ in headers)
+        with self._lock, self.get_connection() as conn:
+            conn.execute(f"INSERT INTO {table_name} ({', '.join(headers)}) VALUES ({placeholders})", values)
 
     def init_stats_table(self) -> None:
         self.create_table(self.stats_table, ['id INTEGER PRIMARY KEY AUTOINCREMENT', 'user_name TEXT'
                                              , 'query TEXT', 'original_title TEXT'])
 
+    def migrate(self) -> None:
+        """Применяет недостающие миграции схемы, версия хранится в PRAGMA user_version."""
+        with self._lock:
+            conn = self.get_connection()
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+                with conn:
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f'PRAGMA user_version = {number}')
 
     def select_queries_by_user(self, user_name: str) -> list[sqlite3.Row]:
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(f'SELECT query, original_title FROM {self.stats_table}\
-                            WHERE user_name = ? ORDER BY id DESC LIMIT 30', (user_name, ))
+        with self._lock:
+            cursor = self.get_connection().execute(
+                f'SELECT query, original_title FROM {self.stats_table}\
+                  WHERE user_name = ? ORDER BY id DESC LIMIT 30', (user_name, ))
             return cursor.fetchall()
 
-
     def select_stats_by_user(self, user_name: str) -> list[sqlite3.Row]:
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(f'SELECT original_title, count(*) FROM {self.stats_table}\
-                            WHERE user_name = ? group by original_title\
-                            ORDER BY count(*) DESC LIMIT 30', (user_name, ))
+        with self._lock:
+            cursor = self.get_connection().execute(
+                f'SELECT original_title, count AS "count(*)" FROM {self.counts_table}\
+                  WHERE user_name = ? ORDER BY count DESC LIMIT 30', (user_name, ))
             return cursor.fetchall()
 
+    def select_top_titles(self, limit: int) -> list[str]:
+        """Самые востребованные фильмы по всем пользователям."""
+        with self._lock:
+            cursor = self.get_connection().execute(
+                f"SELECT original_title FROM {self.counts_table} WHERE original_title NOT IN ('', 'Не найдено')\
+                  GROUP BY original_title ORDER BY sum(count) DESC LIMIT ?", (limit, ))
+            return [row['original_title'] for row in cursor.fetchall()]
+
+    def _last_id(self) -> int:
+        return self.get_connection().execute(f'SELECT max(id) FROM {self.stats_table}').fetchone()[0] or 0
+
+    def select_trending(self, window: int, limit: int) -> list[sqlite3.Row]:
+        """Самые частые фильмы среди последних window запросов и последний запрос к каждому."""
+        with self._lock:
+            start = self._last_id() - window
+            cursor = self.get_connection().execute(
+                f"SELECT original_title, query, max(id) AS last_id, count(*) AS hits FROM {self.stats_table}\
+                  WHERE id > ? AND original_title NOT IN ('', 'Не найдено')\
+                  GROUP BY original_title ORDER BY hits DESC LIMIT ?", (start, limit))
+            return cursor.fetchall()
+
+    def select_spikes(self, window: int, min_hits: int, ratio: float, limit: int) -> list[sqlite3.Row]:
+        """Фильмы, которые в последних window запросах ищут в ratio раз чаще, чем в предыдущих window."""
+        with self._lock:
+            boundary = self._last_id() - window
+            cursor = self.get_connection().execute(
+                f"SELECT original_title, query, max(id) AS last_id, sum(id > ?) AS recent,\
+                         sum(id <= ?) AS previous FROM {self.stats_table}\
+                  WHERE id > ? AND original_title NOT IN ('', 'Не найдено') GROUP BY original_title\
+                  HAVING recent >= ? AND recent >= ? * (previous + 1) ORDER BY recent DESC LIMIT ?",
+                (boundary, boundary, boundary - window, min_hits, ratio, limit))
+            return cursor.fetchall()
 
     def add_user_query(self, query: str, user_name: str, original_title: str) -> None:
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(f'INSERT INTO {self.stats_table} \
+        with self._lock, self.get_connection() as conn:
+            conn.execute(f'INSERT INTO {self.stats_table} \
                            (user_name, query, original_title) VALUES (?, ?, ?)', (user_name, query, original_title))
-            conn.commit()
+
+    def add_user_queries(self, records: list[tuple[str, str, str]]) -> None:
+        """Записывает пачку (user_name, query, original_title) одной транзакцией."""
+        with self._lock, self.get_connection() as conn:
+            conn.executemany(f'INSERT INTO {self.stats_table} \
+                               (user_name, query, original_title) VALUES (?, ?, ?)', records)
+
+    def select_poster_file_id(self, film_key: str, poster_url: str) -> str | None:
+        """file_id постера, если он загружался с того же адреса."""
+        with self._lock:
+            row = self.get_connection().execute(
+                f'SELECT file_id FROM {self.posters_table} WHERE film_key = ? AND poster_url = ?',
+                (film_key, poster_url)).fetchone()
+            return row['file_id'] if row else None
+
+    def save_poster_file_id(self, film_key: str, poster_url: str, file_id: str) -> None:
+        with self._lock, self.get_connection() as conn:
+            conn.execute(f'INSERT OR REPLACE INTO {self.posters_table} (film_key, poster_url, file_id, updated_at)'
+                         ' VALUES (?, ?, ?, ?)', (film_key, poster_url, file_id, time.time()))
+
+    def delete_poster_file_id(self, film_key: str) -> None:
+        with self._lock, self.get_connection() as conn:
+            conn.execute(f'DELETE FROM {self.posters_table} WHERE film_key = ?', (film_key, ))
+
+
+class AsyncMovieData:
+    """Асинхронная обертка над MovieData.
+
+    Все запросы выполняются в отдельном потоке с одним соединением,
+    поэтому работа с базой не блокирует обработку сообщений. Запросы
+    пользователей копятся в буфере и пишутся пачкой, когда набралось
+    flush_size записей или прошло flush_interval секунд. Перед чтением
+    истории пользователя его незаписанные запросы сбрасываются в базу.
+    file_id постеров дополнительно держатся в памяти.
+    """
+
+    def __init__(self, db_path: str = '/app/data/MovieData.db', flush_size: int = HISTORY_FLUSH_SIZE,
+                 flush_interval: float = HISTORY_FLUSH_INTERVAL) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+        self.data = self._executor.submit(MovieData, db_path).result()
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending: list[tuple[str, str, str]] = []
+        self._flush_lock = asyncio.Lock()
+        self._flush_timer: asyncio.Task | None = None
+        self._posters: dict[str, tuple[str, str]] = {}
+        self.counters = {
+            'flushes': 0, 'rows': 0, 'errors': 0, 'max_batch': 0,
+            'flush_seconds': 0.0, 'max_flush_seconds': 0.0,
+        }
+
+    async def _run(self, method, *args):
+        with span(f'sqlite_{method.__name__}'):
+            return await asyncio.get_running_loop().run_in_executor(self._executor, method, *args)
+
+    async def _flush_user(self, user_name: str) -> None:
+        if any(record[0] == user_name for record in self._pending):
+            await self.flush()
+
+    async def select_queries_by_user(self, user_name: str) -> list[sqlite3.Row]:
+        await self._flush_user(user_name)
+        return await self._run(self.data.select_queries_by_user, user_name)
+
+    async def select_stats_by_user(self, user_name: str) -> list[sqlite3.Row]:
+        await self._flush_user(user_name)
+        return await self._run(self.data.select_stats_by_user, user_name)
+
+    async def select_trending(self, window: int, limit: int) -> list[sqlite3.Row]:
+        await self.flush()
+        return await self._run(self.data.select_trending, window, limit)
+
+    async def select_spikes(self, window: int, min_hits: int, ratio: float, limit: int) -> list[sqlite3.Row]:
+        await self.flush()
+        return await self._run(self.data.select_spikes, window, min_hits, ratio, limit)
+
+    async def add_user_query(self, query: str, user_name: str, original_title: str) -> None:
+        self._pending.append((user_name, query, original_title))
+        if len(self._pending) >= self.flush_size:
+            await self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.create_task(self._flush_later())
+
+    async def select_poster_file_id(self, film_key: str, poster_url: str) -> str | None:
+        cached = self._posters.get(film_key)
+        if cached is not None and cached[0] == poster_url:
+            return cached[1]
+        file_id = await self._run(self.data.select_poster_file_id, film_key, poster_url)
+        if file_id is not None:
+            self._posters[film_key] = (poster_url, file_id)
+        return file_id
+
+    async def save_poster_file_id(self, film_key: str, poster_url: str, file_id: str) -> None:
+        self._posters[film_key] = (poster_url, file_id)
+        await self._run(self.data.save_poster_file_id, film_key, poster_url, file_id)
+
+    async def delete_poster_file_id(self, film_key: str) -> None:
+        self._posters.pop(film_key, None)
+        await self._run(self.data.delete_poster_file_id, film_key)
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self._flush_timer = None
+        try:
+            await self.flush()
+        except sqlite3.Error:
+            pass
+
+    async def flush(self) -> None:
+        """Записывает накопленные запросы одной транзакцией."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            started = time.monotonic()
+            try:
+                await self._run(self.data.add_user_queries, batch)
+            except sqlite3.Error:
+                self.counters['errors'] += 1
+                self._pending[:0] = batch
+                raise
+            elapsed = time.monotonic() - started
+            self.counters['flushes'] += 1
+            self.counters['rows'] += len(batch)
+            self.counters['max_batch'] = max(self.counters['max_batch'], len(batch))
+            self.counters['flush_seconds'] += elapsed
+            self.counters['max_flush_seconds'] = max(self.counters['max_flush_seconds'], elapsed)
+
+    def stats(self) -> dict[str, Any]:
+        flushes = self.counters['flushes']
+        return {
+            **self.counters,
+            'pending': len(self._pending),
+            'avg_batch': self.counters['rows'] / flushes if flushes else 0.0,
+            'avg_flush_seconds': self.counters['flush_seconds'] / flushes if flushes else 0.0,
+        }
+
+    async def close(self) -> None:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        await self.flush()
+        await self._run(self.data.close)
+        self._executor.shutdown()
@@ -1,21 +1,100 @@
 import asyncio
+import html
 import os
-from telebot.types import Message
+import re
+import signal
+from telebot import asyncio_helper
+from telebot.asyncio_helper import ApiTelegramException
+from telebot.types import Message, Update
 from telebot.async_telebot import AsyncTeleBot
-from load_data import MovieData
-from network_requests import search_imdb
+from load_data import AsyncMovieData
+from core.aliases import ALIASES
+from core.breaker import breaker_stats
+from core.cache import CACHE_DB_PATH, FILM_CACHE
+from core.catalog import CATALOG
+from core.film import FilmRecord
+from core.http_client import close_client, pool_stats, start_client
+from core.metrics import METRICS
+from core.pipeline import StageTimeout
+from core.rate_limit import RETRIES, UpstreamUnavailable, rate_limit_stats, retry_delay
+from core.render_cache import RENDER_CACHE, film_key
+from core.search import search_film
+from core.tracing import new_trace, setup_logging, span
+from core.workers import CPU_POOL, WorkerPoolBusy
+from dispatcher import UpdateDispatcher, chat_id
+from prefetch import PREFETCH_ENABLED, Prefetcher
+from transport import WEBHOOK_SECRET, run_polling, run_webhook
 from format_card import format_movie_card, get_times_word
-from format_card import parse_kinopoisk
 from format_card import create_watch_button
 
 API_KEY = os.getenv('BOT_TOKEN')
-
-DATA_BASE = MovieData()
+# постер и карточка одним сообщением с подписью вместо двух
+POSTER_CAPTION = os.getenv('POSTER_CAPTION', '0') == '1'
+CAPTION_LIMIT = 1024
+# чат, например закрытый канал бота, куда предвыборка загружает постеры ради file_id; пусто -- не загружать
+PREFETCH_POSTER_CHAT = os.getenv('PREFETCH_POSTER_CHAT', '')
+TAG_RE = re.compile(r'<[^>]+>')
+# polling или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# адрес Bot API, например локальной заглушки
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')
+if TELEGRAM_API_URL:
+    asyncio_helper.API_URL = TELEGRAM_API_URL.rstrip('/') + '/bot{0}/{1}'
+
+setup_logging()
+DATA_BASE = AsyncMovieData(CACHE_DB_PATH)
 if API_KEY is None:
     raise RuntimeError('API_KEY is None')
+# без секрета обновления в вебхук мог бы прислать кто угодно
+if BOT_MODE == 'webhook' and not WEBHOOK_SECRET:
+    raise RuntimeError('WEBHOOK_SECRET is required in webhook mode')
 
 BOT = AsyncTeleBot(API_KEY)
 
+def caption_length(card: str) -> int:
+    """Длина подписи так, как ее считает Telegram: без HTML-разметки."""
+    return len(html.unescape(TAG_RE.sub('', card)))
+
+
+def bad_file_id(e: ApiTelegramException) -> bool:
+    """Telegram больше не знает сохраненный file_id -- его нужно забыть."""
+    description = e.description.lower()
+    return e.error_code == 400 and ('wrong file identifier' in description or 'file reference' in description)
+
+
+async def send_poster(chat_id: int, film_info: FilmRecord, caption: str | None = None, reply_markup=None) -> bool:
+    """Отправляет постер по сохраненному file_id, а при первой отправке -- по адресу.
+
+    Возвращает False, если постера нет или Telegram не смог его загрузить.
+    Сохраненный file_id забывается, только если Telegram его не принял;
+    на 429 и 5xx отправка по нему повторяется.
+    """
+    poster_url = film_info.poster
+    if not poster_url or poster_url == 'N/A':
+        return False
+    key = str(film_key(film_info))
+    extra = {'caption': caption, 'parse_mode': 'HTML', 'reply_markup': reply_markup} if caption else {}
+    file_id = await DATA_BASE.select_poster_file_id(key, poster_url)
+    for attempt in range(RETRIES + 1 if file_id is not None else 0):
+        try:
+            await BOT.send_photo(chat_id, file_id, **extra)
+            return True
+        except ApiTelegramException as e:
+            if bad_file_id(e):
+                await DATA_BASE.delete_poster_file_id(key)
+                break
+            if attempt == RETRIES or not (e.error_code == 429 or e.error_code >= 500):
+                return False
+            retry_after = (e.result_json.get('parameters') or {}).get('retry_after')
+            await asyncio.sleep(retry_delay(attempt, str(retry_after) if retry_after else None))
+    try:
+        sent = await BOT.send_photo(chat_id, poster_url, **extra)
+    except ApiTelegramException:
+        return False
+    await DATA_BASE.save_poster_file_id(key, poster_url, sent.photo[-1].file_id)
+    return True
+
+
 @BOT.message_handler(commands=['start'])
 async def start(message: Message):
     await BOT.send_message(
@@ -34,7 +113,7 @@ async def help(message: Message):
 
 @BOT.message_handler(commands=['stats'])
 async def help_cmd(message: Message):
-    stat = DATA_BASE.select_stats_by_user(message.chat.username)
+    stat = await DATA_BASE.select_stats_by_user(message.chat.username)
 
     text = "📊 <b>Статистика показов фильмов:</b>\n\n"
     for i, data in enumerate(stat):
@@ -47,7 +126,7 @@ async def help_cmd(message: Message):
 
 @BOT.message_handler(commands=['history'])
 async def history(message: Message):
-    history_data = DATA_BASE.select_queries_by_user(message.chat.username)
+    history_data = await DATA_BASE.select_queries_by_user(message.chat.username)
     text = "📜 <b>История поиска:</b>\n\n"
     for i, item in enumerate(history_data, 1):
         text += (
@@ -66,33 +145,110 @@ async def history(message: Message):
 async def rememeber_all_messages(message: Message):
     user_name = message.chat.username
     if message.text and user_name:
-        watch_url, original_title, kp_info = await parse_kinopoisk(message.text)
-        film_info = kp_info
-        if original_title:
-            imdb_info = await search_imdb(original_title)
-            if imdb_info is not None:
-                film_info = imdb_info
-
-        if film_info is None or original_title is None or watch_url is None:
-            await BOT.send_message(
-                message.chat.id,
-                'По вашему запросу ничего не найдено. Попробуйте поискать другой фильм'
-            )
+        try:
+            watch_url, original_title, film_info = await search_film(message.text)
+            if film_info is None or original_title is None or watch_url is None:
+                await BOT.send_message(
+                    message.chat.id,
+                    'По вашему запросу ничего не найдено. Попробуйте поискать другой фильм'
+                )
+                return
+            card = await RENDER_CACHE.render_in_pool('telegram', film_info, format_movie_card)
+        except (UpstreamUnavailable, WorkerPoolBusy) as e:
+            await BOT.send_message(message.chat.id, str(e))
+            return
+        except StageTimeout:
+            await BOT.send_message(message.chat.id, 'Сервис временно недоступен, попробуйте позже')
             return
 
-        card = format_movie_card(film_info)
-        poster_url = film_info.get('Poster')
         keyboard = create_watch_button(watch_url) if watch_url else None
-        await BOT.send_photo(
-            chat_id=message.chat.id,
-            photo=poster_url,
-        )
-        await BOT.send_message(message.chat.id, card, parse_mode="HTML", reply_markup=keyboard)
-        DATA_BASE.add_user_query(message.text, user_name, film_info.get('Title', 'Не найдено'))
+        single = POSTER_CAPTION and caption_length(card) <= CAPTION_LIMIT
+        if not single:
+            await send_poster(message.chat.id, film_info)
+        if not (single and await send_poster(message.chat.id, film_info, card, keyboard)):
+            await BOT.send_message(message.chat.id, card, parse_mode="HTML", reply_markup=keyboard)
+        await DATA_BASE.add_user_query(message.text, user_name, film_info.title)
 
     else:
         await BOT.send_message(message.chat.id, 'Вы ввели путой запрос. Попробуйте еще раз')
 
 
+async def shed(update: Update) -> None:
+    chat = chat_id(update)
+    if isinstance(chat, int):
+        try:
+            await BOT.send_message(chat, 'Бот сейчас перегружен, повторите запрос через минуту')
+        except ApiTelegramException:
+            pass
+
+
+async def handle_update(update: Update) -> None:
+    new_trace(f'update-{update.update_id}')
+    with span('telegram_update'):
+        await BOT.process_new_updates([update])
+
+
+async def warm_poster(film_info: FilmRecord) -> None:
+    """Загружает постер в PREFETCH_POSTER_CHAT и сохраняет его file_id, если его еще нет.
+
+    Сообщение сразу удаляется: file_id остается действительным для бота.
+    """
+    key = str(film_key(film_info))
+    if await DATA_BASE.select_poster_file_id(key, film_info.poster) is not None:
+        return
+    try:
+        sent = await BOT.send_photo(PREFETCH_POSTER_CHAT, film_info.poster)
+    except ApiTelegramException:
+        return
+    await DATA_BASE.save_poster_file_id(key, film_info.poster, sent.photo[-1].file_id)
+    try:
+        await BOT.delete_message(PREFETCH_POSTER_CHAT, sent.message_id)
+    except ApiTelegramException:
+        pass
+
+
+async def warm_film(film_info: FilmRecord) -> None:
+    """Готовит карточку заранее, а с PREFETCH_POSTER_CHAT -- и file_id постера."""
+    await RENDER_CACHE.render_in_pool('telegram', film_info, format_movie_card)
+    if PREFETCH_POSTER_CHAT and film_info.poster and film_info.poster != 'N/A':
+        await warm_poster(film_info)
+
+
+DISPATCHER = UpdateDispatcher(handle_update, on_shed=shed)
+PREFETCHER = Prefetcher(DATA_BASE, warm_film)
+for name, stats in (("dispatcher", DISPATCHER.stats), ("history", DATA_BASE.stats), ("pool", pool_stats),
+                    ("cache", FILM_CACHE.stats), ("cpu_pool", CPU_POOL.stats), ("rate_limits", rate_limit_stats),
+                    ("catalog", CATALOG.stats), ("render_cache", RENDER_CACHE.stats), ("breakers", breaker_stats),
+                    ("prefetch", PREFETCHER.stats), ("aliases", ALIASES.stats)):
+    METRICS.collect(name, stats)
+
+
+async def main():
+    await start_client()
+    await CATALOG.load()
+    await ALIASES.load(CATALOG)
+    DISPATCHER.start()
+    if PREFETCH_ENABLED:
+        PREFETCHER.start()
+    serve = asyncio.create_task(run_webhook(BOT, DISPATCHER) if BOT_MODE == 'webhook'
+                                else run_polling(BOT, DISPATCHER))
+    # docker stop шлет SIGTERM: останавливаемся сами, чтобы дописать историю и закрыть соединения
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, serve.cancel)
+    try:
+        await serve
+    except asyncio.CancelledError:
+        if not serve.cancelled():
+            raise
+    finally:
+        await PREFETCHER.stop()
+        await DISPATCHER.stop()
+        await BOT.close_session()
+        await close_client()
+        CPU_POOL.shutdown()
+        await DATA_BASE.close()
+
+
 if __name__ == '__main__':
-    asyncio.run(BOT.polling())
+    asyncio.run(main())
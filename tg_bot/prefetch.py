@@ -0,0 +1,146 @@
+"""Фоновая предвыборка популярных фильмов по истории поиска бота.
+
+Раз в PREFETCH_INTERVAL секунд берет из таблицы stats фильмы с резким
+ростом запросов за последние PREFETCH_SPIKE_WINDOW запросов и самые частые
+за последние PREFETCH_HISTORY, и повторяет для них последний запрос
+пользователя. Записи кэша старше PREFETCH_AHEAD * CACHE_TTL загружаются
+заново, поэтому к следующему запросу они еще свежие. Запросы к API идут с
+фоновым приоритетом и ограничены бюджетом на проход: не больше
+PREFETCH_BUDGET запросов к каждому API и не больше PREFETCH_QUOTA_SHARE
+оставшейся суточной квоты.
+
+Насколько предвыборка помогла, видно по prefetch_hits и prefetch_uplift
+в статистике кэша.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+from core.cache import FILM_CACHE, REFRESH_AHEAD
+from core.film import FilmRecord
+from core.normalize import query_key
+from core.rate_limit import BACKGROUND, BUDGET, LIMITS, PRIORITY, Budget, BudgetExhausted
+from core.search import search_film
+from core.tracing import new_trace
+from load_data import AsyncMovieData
+
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', '0') == '1'
+PREFETCH_INTERVAL = float(os.getenv('PREFETCH_INTERVAL', '900'))
+PREFETCH_TOP = int(os.getenv('PREFETCH_TOP', '100'))
+PREFETCH_HISTORY = int(os.getenv('PREFETCH_HISTORY', '20000'))
+PREFETCH_SPIKE_WINDOW = int(os.getenv('PREFETCH_SPIKE_WINDOW', '1000'))
+PREFETCH_SPIKE_MIN = int(os.getenv('PREFETCH_SPIKE_MIN', '3'))
+PREFETCH_SPIKE_RATIO = float(os.getenv('PREFETCH_SPIKE_RATIO', '3'))
+PREFETCH_AHEAD = float(os.getenv('PREFETCH_AHEAD', '0.8'))
+PREFETCH_BUDGET = int(os.getenv('PREFETCH_BUDGET', '200'))
+PREFETCH_QUOTA_SHARE = float(os.getenv('PREFETCH_QUOTA_SHARE', '0.2'))
+PREFETCH_CONCURRENCY = int(os.getenv('PREFETCH_CONCURRENCY', '2'))
+
+logger = logging.getLogger('cinema.prefetch')
+
+
+class Prefetcher:
+    """Периодически обновляет в кэше фильмы, которые скоро понадобятся.
+
+    warm вызывается для каждого найденного фильма, например чтобы заранее
+    собрать карточку.
+    """
+
+    def __init__(self, data: AsyncMovieData, warm: Callable[[FilmRecord], Awaitable[Any]] | None = None,
+                 interval: float = PREFETCH_INTERVAL, concurrency: int = PREFETCH_CONCURRENCY) -> None:
+        self.data = data
+        self.warm = warm
+        self.interval = interval
+        self.concurrency = concurrency
+        self.spent = dict.fromkeys(LIMITS, 0)
+        self.counters = {'runs': 0, 'candidates': 0, 'spikes': 0, 'films': 0, 'not_found': 0, 'errors': 0,
+                         'budget_stops': 0, 'last_run_seconds': 0.0}
+        self._task: asyncio.Task | None = None
+
+    async def candidates(self) -> tuple[list[str], int]:
+        """Запросы для предвыборки: сначала всплески, затем популярные; и число всплесков."""
+        spikes = await self.data.select_spikes(PREFETCH_SPIKE_WINDOW, PREFETCH_SPIKE_MIN, PREFETCH_SPIKE_RATIO,
+                                               PREFETCH_TOP)
+        trending = await self.data.select_trending(PREFETCH_HISTORY, PREFETCH_TOP)
+        queries: dict[str, str] = {}
+        titles = set()
+        for row in [*spikes, *trending]:
+            key = query_key(row['query'] or '')
+            if key and row['original_title'] not in titles and key not in queries:
+                titles.add(row['original_title'])
+                queries[key] = row['query']
+        return list(queries.values())[:PREFETCH_TOP], len(spikes)
+
+    def budget(self) -> Budget:
+        """Бюджет прохода: PREFETCH_BUDGET, но не больше PREFETCH_QUOTA_SHARE остатка суточной квоты."""
+        limits = {}
+        for name, bucket in LIMITS.items():
+            left = bucket.quota_left()
+            limits[name] = PREFETCH_BUDGET if left is None else min(PREFETCH_BUDGET, int(left * PREFETCH_QUOTA_SHARE))
+        return Budget(limits)
+
+    async def _prefetch(self, queue: asyncio.Queue) -> None:
+        while not queue.empty():
+            query = queue.get_nowait()
+            try:
+                _, _, film_info = await search_film(query)
+                if film_info is None:
+                    self.counters['not_found'] += 1
+                    continue
+                self.counters['films'] += 1
+                if self.warm is not None:
+                    await self.warm(film_info)
+            except BudgetExhausted:
+                self.counters['budget_stops'] += 1
+                while not queue.empty():
+                    queue.get_nowait()
+            except Exception:
+                self.counters['errors'] += 1
+                logger.exception('prefetch failed')
+
+    async def run_once(self) -> None:
+        """Один проход предвыборки; контекст задачи получает фоновый приоритет и бюджет."""
+        started = time.monotonic()
+        new_trace(f'prefetch-{self.counters["runs"] + 1}')
+        PRIORITY.set(BACKGROUND)
+        REFRESH_AHEAD.set(FILM_CACHE.ttl * PREFETCH_AHEAD)
+        budget = self.budget()
+        BUDGET.set(budget)
+        queries, spikes = await self.candidates()
+        queue: asyncio.Queue[str] = asyncio.Queue()
+        for query in queries:
+            queue.put_nowait(query)
+        films = self.counters['films']
+        await asyncio.gather(*(self._prefetch(queue) for _ in range(self.concurrency)))
+        for name, spent in budget.spent.items():
+            self.spent[name] += spent
+        self.counters['runs'] += 1
+        self.counters['candidates'] += len(queries)
+        self.counters['spikes'] += spikes
+        self.counters['last_run_seconds'] = round(time.monotonic() - started, 3)
+        logger.info('prefetched %d of %d films (%d spikes), upstream requests %s',
+                    self.counters['films'] - films, len(queries), spikes, budget.spent)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.create_task(self.run_once())
+            except Exception:
+                self.counters['errors'] += 1
+                logger.exception('prefetch run failed')
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {**self.counters, 'enabled': self._task is not None, 'upstream_requests': dict(self.spent)}
@@ -0,0 +1,102 @@
+import asyncio
+import os
+
+from aiohttp import web
+from telebot.async_telebot import AsyncTeleBot
+from telebot.types import Update
+
+from core.metrics import CONTENT_TYPE, METRICS
+from dispatcher import UpdateDispatcher
+
+POLL_TIMEOUT = int(os.getenv('POLL_TIMEOUT', '20'))
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+INTERNAL_HOST = os.getenv('INTERNAL_HOST', '0.0.0.0')
+INTERNAL_PORT = int(os.getenv('INTERNAL_PORT', '9000'))
+
+
+def service_app() -> web.Application:
+    """Служебный HTTP-сервер бота: GET /internal/stats и /metrics на INTERNAL_PORT."""
+    async def internal_stats(_: web.Request) -> web.Response:
+        return web.json_response(METRICS.snapshot())
+
+    async def metrics(_: web.Request) -> web.Response:
+        return web.Response(body=METRICS.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get('/internal/stats', internal_stats)
+    app.router.add_get('/metrics', metrics)
+    return app
+
+
+async def start_server(app: web.Application, host: str = INTERNAL_HOST, port: int = INTERNAL_PORT) -> web.AppRunner:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def run_polling(bot: AsyncTeleBot, dispatcher: UpdateDispatcher) -> None:
+    """Long polling в очередь диспетчера.
+
+    Следующая пачка запрашивается, только когда в очереди есть место, так
+    что лишние обновления остаются ждать на стороне Telegram.
+    """
+    runner = await start_server(service_app())
+    try:
+        await bot.delete_webhook()
+        offset = None
+        error_delay = 0.25
+        while True:
+            await dispatcher.wait_for_room()
+            try:
+                updates = await bot.get_updates(offset=offset, limit=min(100, dispatcher.free),
+                                                timeout=POLL_TIMEOUT, request_timeout=POLL_TIMEOUT + 10)
+            except Exception:
+                await asyncio.sleep(error_delay)
+                error_delay = min(error_delay * 2, 30)
+                continue
+            error_delay = 0.25
+            for update in updates:
+                offset = update.update_id + 1
+                dispatcher.submit(update)
+    finally:
+        await runner.cleanup()
+
+
+async def run_webhook(bot: AsyncTeleBot, dispatcher: UpdateDispatcher) -> None:
+    """HTTP-сервер, который принимает обновления от Telegram, рядом со служебным.
+
+    Ответ Telegram отправляется сразу после постановки в очередь. Отброшенное
+    при перегрузке обновление тоже подтверждается: повторная доставка только
+    усилила бы перегрузку. Запросы без заголовка с WEBHOOK_SECRET отклоняются.
+    """
+    async def receive(request: web.Request) -> web.Response:
+        if not WEBHOOK_SECRET or request.headers.get('X-Telegram-Bot-Api-Secret-Token') != WEBHOOK_SECRET:
+            return web.Response(status=403)
+        try:
+            payload = await request.json()
+            if not isinstance(payload, dict):
+                return web.Response(status=400)
+            update = Update.de_json(payload)
+        except (ValueError, KeyError):
+            return web.Response(status=400)
+        dispatcher.submit(update)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, receive)
+    service_runner = await start_server(service_app())
+    runner = await start_server(app, WEBHOOK_HOST, WEBHOOK_PORT)
+    try:
+        if WEBHOOK_URL:
+            await bot.set_webhook(url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET,
+                                  max_connections=WEBHOOK_MAX_CONNECTIONS)
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await service_runner.cleanup()
@@ -0,0 +1,193 @@
+"""Прогрев кэша фильмов, например после деплоя или очистки базы.
+
+Принимает id Кинопоиска (301 или kp:301), id IMDb (tt0133093) и названия
+(title:1917 -- если название состоит из цифр). С --top N добавляются самые
+запрашиваемые фильмы из MovieData.db. Прогретое записывается в файл
+контрольной точки, поэтому прерванный прогрев продолжается с места остановки.
+
+    python warmup.py --top 500
+    python warmup.py 301 tt0133093 "Матрица" --file titles.txt
+    docker-compose run --rm tg_bot warmup.py --top 500
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from core.aliases import ALIASES
+from core.cache import CACHE_DB_PATH, FILM_CACHE
+from core.catalog import CATALOG
+from core.http_client import close_client, start_client
+from core.network_requests import get_imdb_film_info, get_kinopoisk_film_info, search_imdb
+from core.rate_limit import LIMITS, QuotaExhausted
+from core.search import search_film
+from core.workers import CPU_POOL
+from load_data import MovieData
+
+WARMUP_CHECKPOINT = os.getenv('WARMUP_CHECKPOINT', os.path.join(os.path.dirname(CACHE_DB_PATH), 'warmup.checkpoint'))
+
+KP_ID_RE = re.compile(r'(?:kp:)?(\d+)')
+IMDB_ID_RE = re.compile(r'tt\d+')
+
+
+async def warm_kinopoisk(kp_id: str) -> bool:
+    info = await get_kinopoisk_film_info(kp_id)
+    if info is None:
+        return False
+    imdb_info = await search_imdb(info.original_title) if info.original_title else None
+    await CATALOG.remember(info, [imdb_info.title] if imdb_info else [])
+    return True
+
+
+async def warm_item(item: str) -> bool:
+    """Прогревает кэш для одного фильма; False -- фильм не найден."""
+    if IMDB_ID_RE.fullmatch(item):
+        return await get_imdb_film_info(item) is not None
+    kp_id = KP_ID_RE.fullmatch(item)
+    if kp_id:
+        return await warm_kinopoisk(kp_id[1])
+    _, _, film_info = await search_film(item.removeprefix('title:'))
+    return film_info is not None
+
+
+def share_limits(share: float) -> None:
+    """Оставляет прогреву только долю скорости и суточной квоты каждого API.
+
+    Квота считается с нуля в процессе прогрева: сколько уже потратили сайт и
+    бот, здесь не видно, поэтому доля должна оставлять им запас.
+    """
+    for bucket in LIMITS.values():
+        bucket.rate *= share
+        bucket.burst = max(1, int(bucket.burst * share))
+        bucket.tokens = min(bucket.tokens, bucket.burst)
+        if bucket.daily_quota:
+            bucket.daily_quota = max(1, int(bucket.daily_quota * share))
+
+
+class Warmup:
+    """Прогрев списка фильмов не более чем в concurrency корутин."""
+
+    def __init__(self, items: list[str], checkpoint_path: str, concurrency: int) -> None:
+        self.checkpoint_path = checkpoint_path
+        self.concurrency = concurrency
+        done = self._load_checkpoint()
+        items = list(dict.fromkeys(items))
+        self.pending = [item for item in items if item not in done]
+        self.total = len(self.pending)
+        self.counters = Counter(skipped=len(items) - len(self.pending))
+        self.stop_reason: str | None = None
+        self.started = time.monotonic()
+
+    def _load_checkpoint(self) -> set[str]:
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as checkpoint:
+                return {line.rstrip('\n') for line in checkpoint}
+        except FileNotFoundError:
+            return set()
+
+    def report(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        processed = self.counters['warmed'] + self.counters['not_found'] + self.counters['failed']
+        upstream = sum(bucket.counters['acquired'] for bucket in LIMITS.values())
+        cache = FILM_CACHE.stats()
+        quotas = ', '.join(f'{name} {bucket.used_today}/{bucket.daily_quota}'
+                           for name, bucket in LIMITS.items() if bucket.daily_quota)
+        return (f'[{processed}/{self.total}] warmed {self.counters["warmed"]}, '
+                f'not found {self.counters["not_found"]}, failed {self.counters["failed"]}, '
+                f'skipped {self.counters["skipped"]} | {processed / elapsed:.1f} films/s, '
+                f'{upstream / elapsed:.1f} upstream req/s, '
+                f'cache hits {cache["memory_hits"] + cache["sqlite_hits"]} | quota {quotas}')
+
+    async def _worker(self, queue: asyncio.Queue, checkpoint) -> None:
+        while self.stop_reason is None:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                found = await warm_item(item)
+            except QuotaExhausted as e:
+                self.counters['failed'] += 1
+                self.stop_reason = f'суточная квота {e.upstream} исчерпана'
+                continue
+            except Exception as e:
+                self.counters['failed'] += 1
+                print(f'{item!r}: {e!r}', file=sys.stderr)
+                continue
+            self.counters['warmed' if found else 'not_found'] += 1
+            checkpoint.write(item + '\n')
+            checkpoint.flush()
+
+    async def _report_every(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            print(self.report(), flush=True)
+
+    async def run(self, report_interval: float = 5) -> Counter:
+        queue: asyncio.Queue[str] = asyncio.Queue()
+        for item in self.pending:
+            queue.put_nowait(item)
+        os.makedirs(os.path.dirname(self.checkpoint_path) or '.', exist_ok=True)
+        reporter = asyncio.create_task(self._report_every(report_interval))
+        try:
+            with open(self.checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+                await asyncio.gather(*(self._worker(queue, checkpoint) for _ in range(self.concurrency)))
+        finally:
+            reporter.cancel()
+        print(self.report(), flush=True)
+        if self.stop_reason:
+            print(f'Прогрев остановлен: {self.stop_reason}, осталось {queue.qsize()}', flush=True)
+        return self.counters
+
+
+def read_items(args: argparse.Namespace) -> list[str]:
+    items = list(args.items)
+    if args.file:
+        with (sys.stdin if args.file == '-' else open(args.file, encoding='utf-8')) as source:
+            items += [line.strip() for line in source if line.strip()]
+    if args.top:
+        data_base = MovieData(args.db)
+        try:
+            # названия из базы -- всегда названия, даже из одних цифр («1917»)
+            items += [f'title:{title}' for title in data_base.select_top_titles(args.top)]
+        finally:
+            data_base.close()
+    return items
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description='Прогрев кэша фильмов')
+    parser.add_argument('items', nargs='*', help='id Кинопоиска, id IMDb или названия')
+    parser.add_argument('--file', help="файл со списком, по одному в строке ('-' -- stdin)")
+    parser.add_argument('--top', type=int, default=0, help='добавить N самых запрашиваемых фильмов')
+    parser.add_argument('--db', default=CACHE_DB_PATH, help='база бота со статистикой запросов')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--quota-share', type=float, default=0.2,
+                        help='доля скорости и суточной квоты API, которую может занять прогрев; '
+                             'расход работающих сервисов не учитывается')
+    parser.add_argument('--checkpoint', default=WARMUP_CHECKPOINT)
+    parser.add_argument('--restart', action='store_true', help='начать заново, не глядя на контрольную точку')
+    parser.add_argument('--report-interval', type=float, default=5)
+    args = parser.parse_args()
+
+    items = read_items(args)
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    share_limits(args.quota_share)
+
+    await start_client()
+    await CATALOG.load()
+    await ALIASES.load(CATALOG)
+    try:
+        counters = await Warmup(items, args.checkpoint, args.concurrency).run(args.report_interval)
+    finally:
+        await close_client()
+        CPU_POOL.shutdown()
+    return 1 if counters['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))